@@ -1,12 +1,12 @@
 from logging.config import fileConfig
 import os
-from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
 from app.models import Base
+from app.core.db_url import libpq_database_url
 
 
 # this is the Alembic Config object, which provides
@@ -16,20 +16,10 @@ config = context.config
 # Prefer DATABASE_URL from environment; fall back to alembic.ini
 _env_db_url = os.getenv("DATABASE_URL")
 if _env_db_url:
-    # Alembic expects a sync driver; downgrade async url if provided
-    if _env_db_url.startswith("postgresql+asyncpg://"):
-        _env_db_url = _env_db_url.replace(
-            "postgresql+asyncpg://", "postgresql://", 1)
-
-    # Normalize providers that use "ssl=require" to psycopg2's "sslmode=require"
+    # Alembic expects a sync driver; downgrade the async url and normalize
+    # providers that use "ssl=require" to psycopg2's "sslmode=require"
     try:
-        parts = urlsplit(_env_db_url)
-        qs = dict(parse_qsl(parts.query))
-        if "ssl" in qs and "sslmode" not in qs:
-            val = (qs.pop("ssl") or "").lower()
-            qs["sslmode"] = "require" if val in (
-                "true", "1", "require", "required") else val
-        _env_db_url = urlunsplit(parts._replace(query=urlencode(qs)))
+        _env_db_url = libpq_database_url(_env_db_url)
     except Exception:
         # If parsing fails, fall back to the original URL
         pass
@@ -0,0 +1,85 @@
+"""add user_contacts with frecency and trigram indexes on addresses
+
+Revision ID: 0a7e4c91b3d5
+Revises: f7d25b6e0c13
+Create Date: 2026-10-19 17:48:30.215907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import math
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7e4c91b3d5'
+down_revision: Union[str, Sequence[str], None] = 'f7d25b6e0c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 30-day half-life, matching the CONTACT_FRECENCY_HALF_LIFE_DAYS default
+_RATE = math.log(2) / 30.0
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_email_addresses_address_trgm', 'email_addresses', ['address'],
+                    unique=False, postgresql_using='gin',
+                    postgresql_ops={'address': 'gin_trgm_ops'})
+    op.create_index('ix_email_addresses_name_trgm', 'email_addresses', ['name'],
+                    unique=False, postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_table('user_contacts',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('address_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('messageCount', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('lastContactAt', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['address_id'], ['email_addresses.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'address_id')
+    )
+    op.create_index('ix_user_contacts_user_score', 'user_contacts',
+                    ['user_id', 'score'], unique=False)
+    # Backfill from existing mail (same scoring as crud._CONTACT_FRECENCY_UPSERT)
+    op.execute(f"""
+        WITH edges AS (
+            SELECT u.id AS user_id, r.address_id, e.id AS email_id, e."sentAt", 2.0 AS weight
+            FROM emails e
+            JOIN email_addresses fa ON fa.id = e."fromId"
+            JOIN users u ON u.email = fa.address
+            JOIN email_recipients r ON r.email_id = e.id
+            WHERE r.address_id <> e."fromId"
+            UNION
+            SELECT u.id, e."fromId", e.id, e."sentAt", 1.0
+            FROM emails e
+            JOIN email_recipients r ON r.email_id = e.id
+            JOIN email_addresses ra ON ra.id = r.address_id
+            JOIN users u ON u.email = ra.address
+            WHERE r.address_id <> e."fromId"
+        ),
+        points AS (
+            SELECT user_id, address_id, "sentAt",
+                   ln(weight) + {_RATE!r} * extract(epoch FROM "sentAt" - TIMESTAMP '2020-01-01') / 86400.0 AS v
+            FROM edges
+        ),
+        peaks AS (
+            SELECT *, max(v) OVER (PARTITION BY user_id, address_id) AS m FROM points
+        )
+        INSERT INTO user_contacts (user_id, address_id, score, "messageCount", "lastContactAt")
+        SELECT user_id, address_id, m + ln(sum(exp(v - m))), count(*), max("sentAt")
+        FROM peaks
+        GROUP BY user_id, address_id, m
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_contacts_user_score', table_name='user_contacts')
+    op.drop_table('user_contacts')
+    op.drop_index('ix_email_addresses_name_trgm', table_name='email_addresses',
+                  postgresql_using='gin')
+    op.drop_index('ix_email_addresses_address_trgm', table_name='email_addresses',
+                  postgresql_using='gin')
@@ -0,0 +1,29 @@
+"""add (lastMessageDate, id) keyset index on threads
+
+Revision ID: 1b6cb4ae02c0
+Revises: ee66d23a1be8
+Create Date: 2026-10-19 10:12:41.482113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b6cb4ae02c0'
+down_revision: Union[str, Sequence[str], None] = 'ee66d23a1be8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_threads_last_message_date_id', 'threads',
+                    ['lastMessageDate', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_threads_last_message_date_id', table_name='threads')
@@ -0,0 +1,58 @@
+"""add user_threads projection
+
+Revision ID: 5c2f9e81d4a7
+Revises: 1b6cb4ae02c0
+Create Date: 2026-10-19 11:03:17.226904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2f9e81d4a7'
+down_revision: Union[str, Sequence[str], None] = '1b6cb4ae02c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_threads',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('thread_id', sa.BigInteger(), nullable=False),
+    sa.Column('lastMessageDate', sa.DateTime(), nullable=False),
+    sa.Column('done', sa.Boolean(), nullable=False),
+    sa.Column('inboxStatus', sa.Boolean(), nullable=False),
+    sa.Column('draftStatus', sa.Boolean(), nullable=False),
+    sa.Column('sentStatus', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['thread_id'], ['threads.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'thread_id')
+    )
+    op.create_index('ix_user_threads_user_last_message', 'user_threads',
+                    ['user_id', 'lastMessageDate', 'thread_id'], unique=False)
+    # Backfill from the existing address-based access rows
+    op.execute("""
+        INSERT INTO user_threads (user_id, thread_id, "lastMessageDate", done,
+                                  "inboxStatus", "draftStatus", "sentStatus")
+        SELECT u.id, t.id, t."lastMessageDate", t.done,
+               t."inboxStatus", t."draftStatus", t."sentStatus"
+        FROM users u
+        JOIN email_addresses ea ON ea.address = u.email
+        JOIN address_has_threads aht ON aht.address_id = ea.id
+        JOIN threads t ON t.id = aht.thread_id
+        ON CONFLICT DO NOTHING
+    """)
+    # Listing pages now scan ix_user_threads_user_last_message instead
+    op.drop_index('ix_threads_last_message_date_id', table_name='threads')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_threads_last_message_date_id', 'threads',
+                    ['lastMessageDate', 'id'], unique=False)
+    op.drop_index('ix_user_threads_user_last_message', table_name='user_threads')
+    op.drop_table('user_threads')
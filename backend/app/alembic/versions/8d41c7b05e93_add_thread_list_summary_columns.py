@@ -0,0 +1,54 @@
+"""add messageCount/participants summary columns to threads
+
+Revision ID: 8d41c7b05e93
+Revises: 5c2f9e81d4a7
+Create Date: 2026-10-19 11:48:52.903315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41c7b05e93'
+down_revision: Union[str, Sequence[str], None] = '5c2f9e81d4a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('threads', sa.Column('messageCount', sa.Integer(),
+                  server_default='0', nullable=False))
+    op.add_column('threads', sa.Column('participants', postgresql.ARRAY(sa.String()),
+                  server_default='{}', nullable=False))
+    op.execute("""
+        UPDATE threads t SET "messageCount" = c.n
+        FROM (SELECT "threadId" AS tid, count(*) AS n FROM emails GROUP BY 1) c
+        WHERE c.tid = t.id
+    """)
+    op.execute("""
+        UPDATE threads t SET participants = p.names
+        FROM (
+            SELECT tid, (array_agg(label ORDER BY last_sent DESC, label))[1:5] AS names
+            FROM (
+                SELECT e."threadId" AS tid,
+                       COALESCE(NULLIF(ea.name, ''), ea.address) AS label,
+                       max(e."sentAt") AS last_sent
+                FROM emails e
+                JOIN email_addresses ea ON ea.id = e."fromId"
+                GROUP BY 1, 2
+            ) s
+            GROUP BY tid
+        ) p
+        WHERE p.tid = t.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('threads', 'participants')
+    op.drop_column('threads', 'messageCount')
@@ -0,0 +1,92 @@
+"""add user_folder_counts maintained by a user_threads trigger
+
+Revision ID: a3e07f5b29c1
+Revises: 8d41c7b05e93
+Create Date: 2026-10-19 12:31:06.115478
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3e07f5b29c1'
+down_revision: Union[str, Sequence[str], None] = '8d41c7b05e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_folder_counts',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('folder', sa.String(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('open', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'folder')
+    )
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_user_folder_counts(
+            p_user_id integer, p_inbox boolean, p_draft boolean, p_sent boolean,
+            p_done boolean, p_delta integer
+        ) RETURNS void AS $$
+        BEGIN
+            INSERT INTO user_folder_counts (user_id, folder, total, open)
+            SELECT p_user_id, f.folder, p_delta, CASE WHEN p_done THEN 0 ELSE p_delta END
+            FROM (VALUES ('inbox', p_inbox), ('draft', p_draft), ('sent', p_sent)) AS f(folder, flag)
+            WHERE f.flag
+            ON CONFLICT (user_id, folder) DO UPDATE SET
+                total = user_folder_counts.total + EXCLUDED.total,
+                open = user_folder_counts.open + EXCLUDED.open;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION user_threads_folder_counts() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE'
+               AND OLD."inboxStatus" IS NOT DISTINCT FROM NEW."inboxStatus"
+               AND OLD."draftStatus" IS NOT DISTINCT FROM NEW."draftStatus"
+               AND OLD."sentStatus" IS NOT DISTINCT FROM NEW."sentStatus"
+               AND OLD.done IS NOT DISTINCT FROM NEW.done THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM bump_user_folder_counts(OLD.user_id, OLD."inboxStatus", OLD."draftStatus",
+                                                OLD."sentStatus", OLD.done, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM bump_user_folder_counts(NEW.user_id, NEW."inboxStatus", NEW."draftStatus",
+                                                NEW."sentStatus", NEW.done, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_user_threads_folder_counts
+        AFTER INSERT OR UPDATE OR DELETE ON user_threads
+        FOR EACH ROW EXECUTE FUNCTION user_threads_folder_counts()
+    """)
+    # Seed counters from the current projection
+    op.execute("""
+        INSERT INTO user_folder_counts (user_id, folder, total, open)
+        SELECT ut.user_id, f.folder, count(*), count(*) FILTER (WHERE NOT ut.done)
+        FROM user_threads ut
+        CROSS JOIN LATERAL (VALUES ('inbox', ut."inboxStatus"),
+                                   ('draft', ut."draftStatus"),
+                                   ('sent', ut."sentStatus")) AS f(folder, flag)
+        WHERE f.flag
+        GROUP BY ut.user_id, f.folder
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_user_threads_folder_counts ON user_threads")
+    op.execute("DROP FUNCTION IF EXISTS user_threads_folder_counts()")
+    op.execute("DROP FUNCTION IF EXISTS bump_user_folder_counts(integer, boolean, boolean, boolean, boolean, integer)")
+    op.drop_table('user_folder_counts')
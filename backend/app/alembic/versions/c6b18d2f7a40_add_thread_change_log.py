@@ -0,0 +1,48 @@
+"""add thread_changes log and per-user change sequence
+
+Revision ID: c6b18d2f7a40
+Revises: a3e07f5b29c1
+Create Date: 2026-10-19 14:05:44.570261
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6b18d2f7a40'
+down_revision: Union[str, Sequence[str], None] = 'a3e07f5b29c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('changeSeq', sa.BigInteger(),
+                  server_default='0', nullable=False))
+    op.add_column('users', sa.Column('changeSeqFloor', sa.BigInteger(),
+                  server_default='0', nullable=False))
+    op.create_table('thread_changes',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('thread_id', sa.BigInteger(), nullable=False),
+    sa.Column('seq', sa.BigInteger(), nullable=False),
+    sa.Column('op', sa.String(), nullable=False),
+    sa.Column('changedAt', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'thread_id')
+    )
+    op.create_index('ix_thread_changes_user_seq', 'thread_changes',
+                    ['user_id', 'seq'], unique=False)
+    op.create_index('ix_thread_changes_changed_at', 'thread_changes',
+                    ['changedAt'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_thread_changes_changed_at', table_name='thread_changes')
+    op.drop_index('ix_thread_changes_user_seq', table_name='thread_changes')
+    op.drop_table('thread_changes')
+    op.drop_column('users', 'changeSeqFloor')
+    op.drop_column('users', 'changeSeq')
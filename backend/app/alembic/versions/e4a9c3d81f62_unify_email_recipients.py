@@ -0,0 +1,70 @@
+"""unify per-role recipient tables into email_recipients
+
+Revision ID: e4a9c3d81f62
+Revises: c6b18d2f7a40
+Create Date: 2026-10-19 16:22:09.183027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a9c3d81f62'
+down_revision: Union[str, Sequence[str], None] = 'c6b18d2f7a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Old association table per role
+_ROLE_TABLES = {
+    'to': 'email_to_addresses',
+    'cc': 'email_cc_addresses',
+    'bcc': 'email_bcc_addresses',
+    'reply_to': 'email_reply_to_addresses',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('email_recipients',
+    sa.Column('email_id', sa.BigInteger(), nullable=False),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('address_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['address_id'], ['email_addresses.id'], ),
+    sa.PrimaryKeyConstraint('email_id', 'role', 'position')
+    )
+    # The old tables never stored order; number existing rows by address id
+    for role, table in _ROLE_TABLES.items():
+        op.execute(f"""
+            INSERT INTO email_recipients (email_id, role, position, address_id)
+            SELECT email_id, '{role}',
+                   row_number() OVER (PARTITION BY email_id ORDER BY address_id) - 1,
+                   address_id
+            FROM {table}
+        """)
+        op.drop_table(table)
+    op.create_index('ix_email_recipients_address_id', 'email_recipients',
+                    ['address_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for role, table in _ROLE_TABLES.items():
+        op.create_table(table,
+        sa.Column('email_id', sa.BigInteger(), nullable=False),
+        sa.Column('address_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['address_id'], ['email_addresses.id'], ),
+        sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ),
+        sa.PrimaryKeyConstraint('email_id', 'address_id')
+        )
+        op.execute(f"""
+            INSERT INTO {table} (email_id, address_id)
+            SELECT DISTINCT email_id, address_id
+            FROM email_recipients WHERE role = '{role}'
+        """)
+    op.drop_index('ix_email_recipients_address_id', table_name='email_recipients')
+    op.drop_table('email_recipients')
@@ -0,0 +1,42 @@
+"""add generated search vector and GIN index on emails
+
+Revision ID: f7d25b6e0c13
+Revises: e4a9c3d81f62
+Create Date: 2026-10-19 17:03:51.662418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7d25b6e0c13'
+down_revision: Union[str, Sequence[str], None] = 'e4a9c3d81f62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match EMAIL_SEARCH_VECTOR_SQL in app.models at the time of this revision
+_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(subject, '')), 'A') || "
+    "setweight(to_tsvector('english', left(coalesce(body, ''), 200000)), 'B')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Adding a stored generated column rewrites the table and fills it in one pass
+    op.add_column('emails', sa.Column(
+        'searchVector', postgresql.TSVECTOR(),
+        sa.Computed(_SEARCH_VECTOR_SQL, persisted=True), nullable=True))
+    op.create_index('ix_emails_search_vector', 'emails', ['searchVector'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_emails_search_vector', table_name='emails',
+                  postgresql_using='gin')
+    op.drop_column('emails', 'searchVector')
@@ -5,6 +5,7 @@ from fastapi import Depends, HTTPException, Request
 from typing import Annotated
 from app.logger_config import get_logger
 from app.core.security import decode_jwt_token
+from app.core.config import settings
 
 
 logger = get_logger(__name__)
@@ -48,4 +49,15 @@ async def verify_user_email(
         logger.error(f"Error verifying user email: {e}")
         raise HTTPException(status_code=401, detail="Invalid token") from e
 
-TokenDep = Annotated[str, Depends(verify_user_email)]
\ No newline at end of file
+TokenDep = Annotated[str, Depends(verify_user_email)]
+
+
+async def verify_admin(user_email: TokenDep) -> str:
+    """
+    Allow only accounts listed in ADMIN_EMAILS.
+    """
+    if user_email.lower() not in {e.lower() for e in settings.ADMIN_EMAILS}:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return user_email
+
+AdminDep = Annotated[str, Depends(verify_admin)]
\ No newline at end of file
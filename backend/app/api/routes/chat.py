@@ -1,10 +1,16 @@
 from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel
-from app.api.dep import SessionDep, TokenDep
+from pydantic import BaseModel, Field
+from app.api.dep import AdminDep, SessionDep, TokenDep
 from app.logger_config import get_logger
-from app.services.chat_graph import chat_app, llm_test
+from app.core.config import settings
+from app.services.chat_graph import chat_app, sources_from_docs
+from app.services.chat_memory import conversation_key
+from app.services.llm_gateway import deadline_in, get_llm_gateway
+from app.services import metrics, rag_metrics
 from fastapi.responses import StreamingResponse
 import json
+import time
+import uuid
 
 logger = get_logger(__name__)
 
@@ -13,9 +19,42 @@ router = APIRouter(
     tags=["chat"]
 )
 
+# Graph nodes whose LLM tokens are streamed to the client
+_ANSWER_NODES = ("generate", "structured")
+
 
 class ChatMessage(BaseModel):
     message: str
+    # Optional hex id of the thread the user is looking at; scopes retrieval to it
+    thread_id: str | None = None
+    # Conversation to continue; a new one is started (and returned) when omitted
+    conversation_id: str | None = Field(default=None, max_length=64, pattern=r"^[\w-]+$")
+
+    def graph_inputs(self, user_email: str) -> dict:
+        # thread_id is always set so a scope from an earlier turn doesn't persist
+        inputs = {"query": self.message, "user_email": user_email, "thread_id": None}
+        if self.thread_id:
+            try:
+                inputs["thread_id"] = int(self.thread_id, 16)
+            except ValueError:
+                pass
+        return inputs
+
+
+def _graph_config(request: Request, user_email: str, conversation_id: str) -> dict:
+    # Graph nodes reach Redis (answer cache) through the run config; thread_id
+    # selects the conversation in the checkpointer, and every LLM call in the
+    # request shares one deadline
+    return {"configurable": {
+        "redis": getattr(request.app.state, "redis", None),
+        "thread_id": conversation_key(user_email, conversation_id),
+        "deadline": deadline_in(settings.CHAT_DEADLINE_SECONDS),
+    }}
+
+
+def _chat_app(request: Request):
+    # The app built at startup has the memory checkpointer; fall back to the stateless one
+    return getattr(request.app.state, "chat_app", None) or chat_app
 
 
 class EmailSource(BaseModel):
@@ -30,18 +69,25 @@ class EmailSource(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     sources: list[EmailSource] = []
+    conversation_id: str | None = None
 
 
 @router.post("/", response_model=ChatResponse)
 async def chat_with_emails(
     chat_message: ChatMessage,
+    request: Request,
     session: SessionDep,
     user_email: TokenDep,
 ):
     """Chat with your emails using AI via LangGraph RAG."""
     try:
         logger.info(f"Chat request from {user_email}: {chat_message.message}")
-        result = await chat_app.ainvoke({"query": chat_message.message, "user_email": user_email})
+        conversation_id = chat_message.conversation_id or uuid.uuid4().hex
+        result = await _chat_app(request).ainvoke(
+            chat_message.graph_inputs(user_email),
+            config=_graph_config(request, user_email, conversation_id),
+            durability="exit",
+        )
         ans = (result.get("answer", "") or "")
         logger.info(
             "Chat answer ready len=%d preview=%s",
@@ -59,7 +105,7 @@ async def chat_with_emails(
             )
             for s in result.get("sources", [])
         ]
-        return ChatResponse(response=ans, sources=sources)
+        return ChatResponse(response=ans, sources=sources, conversation_id=conversation_id)
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(
@@ -85,30 +131,106 @@ async def get_chat_status(user_email: TokenDep):
 @router.post("/stream")
 async def chat_stream(
     chat_message: ChatMessage,
+    request: Request,
     session: SessionDep,
     user_email: TokenDep,
 ):
-    """Stream a chat response (JSON lines)."""
+    """Stream a chat response (JSON lines).
+
+    Emits a ``sources`` line as soon as retrieval finishes, ``delta`` lines for
+    each LLM token, and a closing ``final`` line with the full answer and the
+    conversation id to send with follow-up questions.
+    """
+    conversation_id = chat_message.conversation_id or uuid.uuid4().hex
+
     async def gen():
+        started = time.perf_counter()
+        ttft_ms = None
+        parts: list[str] = []
+        result: dict = {}
+        retrieval = None
         try:
             logger.info(f"Chat stream request from {user_email}: {chat_message.message}")
-            result = await chat_app.ainvoke({"query": chat_message.message, "user_email": user_email})
-            ans = (result.get("answer", "") or "")
+            inputs = chat_message.graph_inputs(user_email)
+            async for event in _chat_app(request).astream_events(
+                    inputs, config=_graph_config(request, user_email, conversation_id),
+                    version="v2", durability="exit"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    # Only answer tokens; follow-up rewrites and summaries are internal
+                    if event.get("metadata", {}).get("langgraph_node") not in _ANSWER_NODES:
+                        continue
+                    token = getattr(event["data"].get("chunk"), "content", "")
+                    if not token:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                        metrics.observe("chat.ttft_ms", ttft_ms)
+                    parts.append(token)
+                    yield json.dumps({"type": "delta", "data": token}) + "\n"
+                elif kind == "on_chain_end" and event.get("name") == "cache_lookup":
+                    output = event["data"].get("output") or {}
+                    if output.get("cached"):
+                        yield json.dumps({"type": "sources", "data": output.get("sources", [])}) + "\n"
+                elif kind == "on_chain_end" and event.get("name") == "structured":
+                    output = event["data"].get("output") or {}
+                    if output.get("structured"):
+                        yield json.dumps({"type": "sources", "data": output.get("sources", [])}) + "\n"
+                elif kind == "on_chain_end" and event.get("name") == "retrieve":
+                    output = event["data"].get("output") or {}
+                    docs = output.get("docs", [])
+                    retrieval = output.get("retrieval")
+                    yield json.dumps({"type": "sources", "data": sources_from_docs(docs)}) + "\n"
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    result = event["data"].get("output") or {}
+            ans = (result.get("answer", "") or "".join(parts))
+            total_ms = (time.perf_counter() - started) * 1000
+            metrics.observe("chat.stream_total_ms", total_ms)
             logger.info(
-                "Chat stream final len=%d preview=%s",
+                "Chat stream final len=%d ttft_ms=%s total_ms=%.0f preview=%s",
                 len(ans),
+                f"{ttft_ms:.0f}" if ttft_ms is not None else "n/a",
+                total_ms,
                 ans[:200].replace("\n", " ")
             )
-            yield json.dumps({"type": "final", "data": {"answer": ans, "sources": result.get("sources", [])}}) + "\n"
+            yield json.dumps({
+                "type": "final",
+                "data": {"answer": ans, "sources": result.get("sources", []),
+                         "conversation_id": conversation_id},
+                "metrics": {"ttft_ms": round(ttft_ms) if ttft_ms is not None else None,
+                            "total_ms": round(total_ms),
+                            "retrieval": retrieval,
+                            "cached": bool(result.get("cached"))},
+            }) + "\n"
         except Exception as e:
             logger.error(f"Error in chat stream endpoint: {e}")
             yield json.dumps({"type": "error", "message": str(e)}) + "\n"
 
-    return StreamingResponse(gen(), media_type="application/json")
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+
+@router.delete("/conversations/{conversation_id}", status_code=204)
+async def delete_conversation(conversation_id: str, request: Request, user_email: TokenDep):
+    """Forget a conversation's history (e.g. when the user starts a new chat)."""
+    memory = getattr(request.app.state, "chat_memory", None)
+    if memory is not None:
+        try:
+            await memory.delete_conversation(user_email, conversation_id)
+        except Exception as e:
+            logger.error(f"Error deleting conversation: {e}")
+            raise HTTPException(
+                status_code=500, detail="Error deleting conversation")
+
+
+@router.get("/metrics")
+async def chat_metrics(user_email: AdminDep):
+    """Rolling latency summaries for this API process (e.g. time-to-first-token); admins only."""
+    snap = metrics.snapshot()
+    snap["vector_user_size"] = rag_metrics.user_size(user_email)
+    return snap
 
 
 @router.get("/health")
 async def chat_health():
-    """Basic LLM health check; returns a short model response."""
-    out = llm_test("Say 'pong' if you can read this.")
-    return {"ok": bool(out), "answer": out[:200]}
+    """LLM health from recent calls, or a probe cached for LLM_HEALTH_TTL_SECONDS."""
+    return await get_llm_gateway().health()
@@ -1,13 +1,15 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request, Response
 from fastapi.exceptions import HTTPException
 from app.logger_config import get_logger
 from app.api.dep import SessionDep, TokenDep
-from app.models import ReplyEmail, Thread, DbThread, DbEmail, Email, DbEmailAddress, address_has_threads
-from sqlalchemy import and_, select, func
+from app.models import ReplyEmail, Thread, ThreadPage, ThreadSummary, ThreadSummaryPage, ThreadChanges, ThreadBatch, ThreadBatchRequest, SearchResults, Contact, DbThread, DbEmail, Email, DbUserThread, DbUserFolderCount, FOLDER_FLAGS
+from sqlalchemy import and_, select, tuple_
 from sqlalchemy.orm import selectinload
+from pydantic import TypeAdapter
 import httpx
 from app.core.config import settings
-from app.crud import get_aurinko_token
+from app.crud import get_aurinko_token, get_thread_page, get_thread_changes, search_emails, search_contacts, user_id_subquery, encode_cursor, decode_cursor
+from app.services.mail_cache import get_cached, put_cached, thread_page_parts, get_generation, make_etag, etag_matches
 
 logger = get_logger(__name__)
 
@@ -16,6 +18,48 @@ router = APIRouter(
     tags=["mail"]
 )
 
+_threads_adapter = TypeAdapter(list[Thread])
+_emails_adapter = TypeAdapter(list[Email])
+
+
+def _json_response(payload: bytes, etag: str | None = None) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"} if etag else None
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
+async def _cache_lookup(request: Request, user_email: str, *parts) -> tuple[Response | None, int | None]:
+    """Return (short-circuit response or None, mailbox generation to store under).
+    The short-circuit is a 304 when If-None-Match matches, else a cached body;
+    either way Postgres is not touched.
+    """
+    redis = getattr(request.app.state, "redis", None)
+    if redis is None:
+        return None, None
+    try:
+        generation = await get_generation(redis, user_email)
+        etag = make_etag(generation, *parts)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"}), generation
+        payload, generation = await get_cached(redis, user_email, *parts)
+    except Exception as e:
+        logger.warning(f"Mail cache read failed: {e}")
+        return None, None
+    if payload is None:
+        return None, generation
+    return _json_response(payload, make_etag(generation, *parts)), generation
+
+
+async def _cache_store(request: Request, user_email: str, generation: int | None, payload: bytes, *parts) -> Response:
+    redis = getattr(request.app.state, "redis", None)
+    if redis is None or generation is None:
+        return _json_response(payload)
+    try:
+        await put_cached(redis, user_email, generation, payload, *parts)
+    except Exception as e:
+        logger.warning(f"Mail cache write failed: {e}")
+    return _json_response(payload, make_etag(generation, *parts))
+
+
 '''
 Test with:
 curl -X GET "http://localhost:8000/mail/threads/<thread_id>/messages" \
@@ -25,17 +69,21 @@ curl -X GET "http://localhost:8000/mail/threads/<thread_id>/messages" \
 
 
 @router.get("/threads/{thread_id}/messages", response_model=list[Email])
-async def get_thread_messages(thread_id: int, session: SessionDep, user_email: TokenDep):
+async def get_thread_messages(thread_id: int, request: Request, session: SessionDep, user_email: TokenDep):
     """
     Get all messages in a thread.
     """
     try:
+        parts = ("thread", thread_id, "messages")
+        cached, generation = await _cache_lookup(request, user_email, *parts)
+        if cached is not None:
+            return cached
+
         # First check if the thread exists and user has access
-        thread_query = select(DbThread).where(
+        thread_query = select(DbUserThread.thread_id).where(
             and_(
-                DbThread.id == thread_id,
-                DbThread.addresses_with_access.any(
-                    DbEmailAddress.address == user_email)
+                DbUserThread.user_id == user_id_subquery(user_email),
+                DbUserThread.thread_id == thread_id
             )
         )
 
@@ -49,15 +97,14 @@ async def get_thread_messages(thread_id: int, session: SessionDep, user_email: T
         # Get all emails in the thread using the relationship
         email_query = select(DbEmail).where(DbEmail.threadId == thread_id).options(
             selectinload(DbEmail.from_address),
-            selectinload(DbEmail.to_addresses),
-            selectinload(DbEmail.cc_addresses),
-            selectinload(DbEmail.bcc_addresses),
-            selectinload(DbEmail.reply_to_addresses)
+            selectinload(DbEmail.recipients)
         )
         results = await session.execute(email_query)
         emails = results.scalars().all()
 
-        return emails
+        payload = _emails_adapter.dump_json(
+            _emails_adapter.validate_python(emails, from_attributes=True))
+        return await _cache_store(request, user_email, generation, payload, *parts)
     except HTTPException:
         raise
     except Exception as e:
@@ -126,44 +173,153 @@ async def reply_to_message(message_id: str, reply_email: ReplyEmail, session: Se
 
 
 @router.get("/threads", response_model=list[Thread])
-async def get_user_threads(page: int, limit: int, session: SessionDep, user_email: TokenDep):
+async def get_user_threads(page: int, limit: int, request: Request, session: SessionDep, user_email: TokenDep):
     """
     Get paginated threads with their associated emails.
     """
     try:
+        parts = ("threads", "page", page, limit)
+        cached, generation = await _cache_lookup(request, user_email, *parts)
+        if cached is not None:
+            return cached
+
         offset = (page - 1) * limit
         # Get threads where the user has access - using join for better performance
         # Include emails with their related addresses
         query = (
             select(DbThread)
-            .join(address_has_threads)
-            .join(DbEmailAddress)
-            .where(DbEmailAddress.address == user_email)
+            .join(DbUserThread, DbUserThread.thread_id == DbThread.id)
+            .where(DbUserThread.user_id == user_id_subquery(user_email))
             .options(
                 selectinload(DbThread.emails).selectinload(
                     DbEmail.from_address),
                 selectinload(DbThread.emails).selectinload(
-                    DbEmail.to_addresses),
-                selectinload(DbThread.emails).selectinload(
-                    DbEmail.cc_addresses),
-                selectinload(DbThread.emails).selectinload(
-                    DbEmail.bcc_addresses),
-                selectinload(DbThread.emails).selectinload(
-                    DbEmail.reply_to_addresses)
+                    DbEmail.recipients)
             )
             .offset(offset)
             .limit(limit)
-            .order_by(DbThread.lastMessageDate.desc())
+            .order_by(DbUserThread.lastMessageDate.desc(), DbUserThread.thread_id.desc())
         )
 
         results = await session.execute(query)
         threads = results.scalars().all()
-        return threads
+        payload = _threads_adapter.dump_json(
+            _threads_adapter.validate_python(threads, from_attributes=True))
+        return await _cache_store(request, user_email, generation, payload, *parts)
     except Exception as e:
         logger.error(f"Error fetching user threads: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+'''
+Test with:
+curl -X GET "http://localhost:8000/mail/threads/cursor?limit=20" \
+    -H "Authorization: Bearer <token>"
+curl -X GET "http://localhost:8000/mail/threads/cursor?limit=20&cursor=<nextCursor>" \
+    -H "Authorization: Bearer <token>"
+'''
+
+
+@router.get("/threads/cursor", response_model=ThreadPage)
+async def get_user_threads_by_cursor(
+    request: Request,
+    session: SessionDep,
+    user_email: TokenDep,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+):
+    """
+    Get threads newest-first using keyset pagination on (lastMessageDate, id).
+    Pages stay stable when new mail arrives and deep pages cost the same as the first.
+    """
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        parts = thread_page_parts(limit, cursor)
+        cached, generation = await _cache_lookup(request, user_email, *parts)
+        if cached is not None:
+            return cached
+        page = await get_thread_page(session, user_email, limit, cursor)
+        return await _cache_store(request, user_email, generation, page.model_dump_json().encode(), *parts)
+    except Exception as e:
+        logger.error(f"Error fetching user threads by cursor: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+'''
+Test with:
+curl -X GET "http://localhost:8000/mail/threads/summary?limit=50" \
+    -H "Authorization: Bearer <token>"
+'''
+
+
+@router.get("/threads/summary", response_model=ThreadSummaryPage)
+async def get_user_thread_summaries(
+    request: Request,
+    session: SessionDep,
+    user_email: TokenDep,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+):
+    """
+    Get a page of thread rows for list views: subject, newest snippet, message
+    count and participant names. No emails or bodies are loaded; fetch full
+    messages from /mail/thread/{thread_id}.
+    """
+    try:
+        parts = ("threads", "summary", limit, cursor or "")
+        cached, generation = await _cache_lookup(request, user_email, *parts)
+        if cached is not None:
+            return cached
+
+        query = (
+            select(
+                DbThread.id,
+                DbThread.subject,
+                DbThread.brief,
+                DbThread.messageCount,
+                DbThread.participants,
+                DbUserThread.lastMessageDate,
+                DbUserThread.done,
+                DbUserThread.inboxStatus,
+                DbUserThread.draftStatus,
+                DbUserThread.sentStatus,
+            )
+            .join(DbUserThread, DbUserThread.thread_id == DbThread.id)
+            .where(DbUserThread.user_id == user_id_subquery(user_email))
+            .order_by(DbUserThread.lastMessageDate.desc(), DbUserThread.thread_id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            try:
+                last_date, last_id = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = query.where(
+                tuple_(DbUserThread.lastMessageDate, DbUserThread.thread_id) < tuple_(last_date, last_id))
+
+        results = await session.execute(query)
+        rows = results.mappings().all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(
+                rows[-1]["lastMessageDate"], rows[-1]["id"])
+        page = ThreadSummaryPage(
+            threads=[ThreadSummary.model_validate(dict(r)) for r in rows],
+            nextCursor=next_cursor,
+        )
+        return await _cache_store(request, user_email, generation, page.model_dump_json().encode(), *parts)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching thread summaries: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 '''
 Test with:
 curl -X GET "http://localhost:8000/mail/threads/count?status=inbox" \
@@ -180,26 +336,22 @@ curl -X GET "http://localhost:8000/mail/threads/count?status=sent" \
 async def get_thread_counts(status: str, session: SessionDep, user_email: TokenDep):
     """
     Get the count of threads based on their status.
+    Reads the per-user counters maintained alongside user_threads.
     """
     try:
-        # More efficient join-based query
-        base_query = select(func.count(DbThread.id)).select_from(
-            DbThread.join(address_has_threads).join(DbEmailAddress)
-        ).where(DbEmailAddress.address == user_email)
-
-        if status == "inbox":
-            query = base_query.where(DbThread.inboxStatus is True)
-        elif status == "draft":
-            query = base_query.where(DbThread.draftStatus is True)
-        elif status == "sent":
-            query = base_query.where(DbThread.sentStatus is True)
-        else:
+        if status not in FOLDER_FLAGS:
             raise HTTPException(
                 status_code=400, detail="Invalid status. Must be 'inbox', 'draft', or 'sent'.")
 
+        query = select(DbUserFolderCount.total, DbUserFolderCount.open).where(
+            and_(
+                DbUserFolderCount.user_id == user_id_subquery(user_email),
+                DbUserFolderCount.folder == status
+            )
+        )
         results = await session.execute(query)
-        count = results.scalar_one()
-        return {"count": count}
+        row = results.one_or_none()
+        return {"count": row.total if row else 0, "open": row.open if row else 0}
     except HTTPException:
         raise
     except Exception as e:
@@ -207,34 +359,201 @@ async def get_thread_counts(status: str, session: SessionDep, user_email: TokenD
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+'''
+Test with:
+curl -X GET "http://localhost:8000/mail/contacts?q=ann" \
+    -H "Authorization: Bearer <token>"
+'''
+
+
+@router.get("/contacts", response_model=list[Contact])
+async def get_contacts(
+    session: SessionDep,
+    user_email: TokenDep,
+    q: str = Query(..., min_length=1, max_length=128),
+    limit: int = Query(8, ge=1, le=25),
+):
+    """
+    Recipient suggestions for compose/reply, limited to addresses the user has
+    exchanged mail with and ranked by how often and how recently they did.
+    """
+    try:
+        return await search_contacts(session, user_email, q, limit)
+    except Exception as e:
+        logger.error(f"Error fetching contact suggestions: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+'''
+Test with:
+curl -X GET "http://localhost:8000/mail/search?q=invoice%20march&limit=20" \
+    -H "Authorization: Bearer <token>"
+'''
+
+
+@router.get("/search", response_model=SearchResults)
+async def search_mail(
+    request: Request,
+    session: SessionDep,
+    user_email: TokenDep,
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+):
+    """
+    Full-text search over subjects and bodies of the user's emails.
+    Supports web-search syntax ("quoted phrases", -exclusions, OR).
+    """
+    try:
+        parts = ("search", q, limit, offset)
+        cached, generation = await _cache_lookup(request, user_email, *parts)
+        if cached is not None:
+            return cached
+        hits = await search_emails(session, user_email, q, limit, offset)
+        payload = SearchResults(query=q, hits=hits).model_dump_json().encode()
+        return await _cache_store(request, user_email, generation, payload, *parts)
+    except Exception as e:
+        logger.error(f"Error searching mail: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+'''
+Test with:
+curl -X POST "http://localhost:8000/mail/threads/batch" \
+    -H "Authorization: Bearer <token>" -H "Content-Type: application/json" \
+    -d '{"ids": ["1988b48816197963", "19778fdd6eb3eaf9"]}'
+'''
+
+
+# Thread ids are Postgres bigints; anything outside can't exist (and asyncpg
+# would reject the parameter, failing the whole batch)
+_BIGINT_MAX = 2**63 - 1
+
+
+def _parse_thread_id(raw: str | int) -> int | None:
+    if isinstance(raw, int):
+        tid = raw
+    else:
+        s = raw.strip().lower()
+        if s.startswith("0x"):
+            s = s[2:]
+        try:
+            tid = int(s, 16)
+        except ValueError:
+            return None
+    return tid if 0 <= tid <= _BIGINT_MAX else None
+
+
+@router.post("/threads/batch", response_model=ThreadBatch)
+async def get_threads_batch(body: ThreadBatchRequest, session: SessionDep, user_email: TokenDep):
+    """
+    Fetch several threads at once: one access-filtered query plus one round of
+    relationship loading. Order follows the request; unknown or inaccessible
+    ids are listed in `missing`.
+    """
+    if len(body.ids) > settings.THREAD_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.THREAD_BATCH_MAX_IDS} ids per request.")
+    try:
+        requested = [(raw, _parse_thread_id(raw)) for raw in body.ids]
+        wanted = {tid for _, tid in requested if tid is not None}
+        by_id: dict[int, DbThread] = {}
+        if wanted:
+            query = (
+                select(DbThread)
+                .join(DbUserThread, DbUserThread.thread_id == DbThread.id)
+                .where(
+                    and_(
+                        DbUserThread.user_id == user_id_subquery(user_email),
+                        DbUserThread.thread_id.in_(wanted)
+                    )
+                )
+                .options(
+                    selectinload(DbThread.emails).options(
+                        selectinload(DbEmail.from_address),
+                        selectinload(DbEmail.recipients),
+                    )
+                )
+            )
+            result = await session.execute(query)
+            by_id = {t.id: t for t in result.scalars().all()}
+
+        batch = ThreadBatch()
+        seen: set[int] = set()
+        for raw, tid in requested:
+            if tid is None or tid not in by_id:
+                batch.missing.append(str(raw))
+                continue
+            # Duplicate ids are returned once
+            if tid in seen:
+                continue
+            seen.add(tid)
+            batch.threads.append(Thread.model_validate(by_id[tid], from_attributes=True))
+        return batch
+    except Exception as e:
+        logger.error(f"Error fetching thread batch: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+'''
+Test with:
+curl -X GET "http://localhost:8000/mail/changes" \
+    -H "Authorization: Bearer <token>"
+curl -X GET "http://localhost:8000/mail/changes?since=42" \
+    -H "Authorization: Bearer <token>"
+'''
+
+
+@router.get("/changes", response_model=ThreadChanges)
+async def get_mail_changes(
+    session: SessionDep,
+    user_email: TokenDep,
+    since: str | None = None,
+    limit: int = Query(500, ge=1, le=2000),
+):
+    """
+    Thread ids upserted and deleted since a change-feed cursor.
+    Call without `since` to get the current cursor; follow `hasMore` to drain.
+    `reset` means the cursor predates retained history and the list must reload.
+    """
+    try:
+        since_seq = int(since) if since is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        return await get_thread_changes(session, user_email, since_seq, limit)
+    except Exception as e:
+        logger.error(f"Error fetching mail changes: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @router.get("/thread/{thread_id}", response_model=Thread)
-async def get_single_thread(thread_id: int, session: SessionDep, user_email: TokenDep):
+async def get_single_thread(thread_id: int, request: Request, session: SessionDep, user_email: TokenDep):
     """
     Get a single thread by ID.
     """
     try:
+        parts = ("thread", thread_id)
+        cached, generation = await _cache_lookup(request, user_email, *parts)
+        if cached is not None:
+            return cached
+
         # Query for the specific thread with access check
         query = (
             select(DbThread)
-            .join(address_has_threads, DbThread.id == address_has_threads.c.thread_id)
-            .join(DbEmailAddress, address_has_threads.c.address_id == DbEmailAddress.id)
+            .join(DbUserThread, DbUserThread.thread_id == DbThread.id)
             .where(
                 and_(
-                    DbThread.id == thread_id,
-                    DbEmailAddress.address == user_email
+                    DbUserThread.user_id == user_id_subquery(user_email),
+                    DbUserThread.thread_id == thread_id
                 )
             )
             .options(
                 selectinload(DbThread.emails).selectinload(
                     DbEmail.from_address),
                 selectinload(DbThread.emails).selectinload(
-                    DbEmail.to_addresses),
-                selectinload(DbThread.emails).selectinload(
-                    DbEmail.cc_addresses),
-                selectinload(DbThread.emails).selectinload(
-                    DbEmail.bcc_addresses),
-                selectinload(DbThread.emails).selectinload(
-                    DbEmail.reply_to_addresses)
+                    DbEmail.recipients)
             )
         )
 
@@ -248,7 +567,7 @@ async def get_single_thread(thread_id: int, session: SessionDep, user_email: Tok
             )
 
         # Convert to Pydantic model
-        return Thread(
+        model = Thread(
             id=thread.id,
             subject=thread.subject,
             lastMessageDate=thread.lastMessageDate,
@@ -259,6 +578,7 @@ async def get_single_thread(thread_id: int, session: SessionDep, user_email: Tok
             sentStatus=thread.sentStatus,
             emails=thread.emails
         )
+        return await _cache_store(request, user_email, generation, model.model_dump_json().encode(), *parts)
 
     except HTTPException:
         raise
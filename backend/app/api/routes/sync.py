@@ -1,5 +1,9 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from app.api.dep import TokenDep
+from app.core.config import settings
+import asyncio
+import json
 
 router = APIRouter(prefix="/sync", tags=["sync"])
 
@@ -12,3 +16,52 @@ async def sync_status(request: Request, user_email: TokenDep):
 
     # decode bytes to strings
     return {k.decode(): v.decode() for k, v in data.items()}
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+'''
+Test with:
+curl -N "http://localhost:8000/sync/events" \
+    -H "Authorization: Bearer <token>"
+'''
+
+
+@router.get("/events")
+async def sync_events(request: Request, user_email: TokenDep):
+    """
+    Server-sent events: `sync` progress, `threads` changed, and `resync` when
+    the client fell behind and should refetch. Replaces polling /sync/status.
+    """
+    hub = getattr(request.app.state, "events", None)
+    if hub is None:
+        raise HTTPException(status_code=503, detail="Event stream unavailable")
+
+    # Current status first so a client connecting mid-sync has a starting point
+    data = await request.app.state.redis.hgetall(f"sync:status:{user_email}")
+    initial = {k.decode(): v.decode() for k, v in data.items()} if data else {"state": "idle"}
+    sub = hub.subscribe(user_email)
+
+    async def stream():
+        try:
+            yield _sse("sync", initial)
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        sub.queue.get(), timeout=settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(message.get("event", "message"), message.get("data"))
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -32,17 +32,90 @@ class Settings(BaseSettings):
     # security related
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    # Accounts allowed to read process-wide operational endpoints (metrics)
+    ADMIN_EMAILS: list[str] = []
 
     # OpenAI/AI related
     OPENAI_API_KEY: str
     OPENAI_MODEL: str
     EMBEDDING_MODEL: str
     EMBEDDING_DIM: int
+    # Embedding batcher: token budget per request and batches in flight
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100_000
+    EMBEDDING_BATCH_MAX_ITEMS: int = 512
+    EMBEDDING_CONCURRENCY: int = 4
+    # Query embedding cache: per-process LRU entries, and Redis TTL for the shared copy
+    EMBEDDING_CACHE_SIZE: int = 1024
+    EMBEDDING_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    # Log collection counts when a vector store is created (scans the collection)
+    VECTOR_STORE_DEBUG_COUNTS: bool = False
+    # Threads available for blocking calls (Chroma) made from async code
+    BLOCKING_EXECUTOR_WORKERS: int = 8
+    # Hybrid retrieval: candidates fetched from each leg before RRF fusion
+    HYBRID_CANDIDATES: int = 30
+    # Context packing: MMR keeps up to CONTEXT_MAX_CHUNKS chunks (lambda trades
+    # relevance for diversity, near-duplicates above the similarity are dropped),
+    # then merged emails are packed into CONTEXT_MAX_TOKENS prompt tokens
+    CONTEXT_MAX_CHUNKS: int = 12
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    CONTEXT_DUPLICATE_SIMILARITY: float = 0.97
+    CONTEXT_MAX_TOKENS: int = 3000
+    CONTEXT_MIN_BLOCK_TOKENS: int = 150
+    # Semantic answer cache: per-user answers reused for similar questions while
+    # the mailbox generation is unchanged
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.95
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 50
+    # Multi-turn chat memory (Postgres checkpointer): recent messages kept
+    # verbatim up to the message/token limits, older ones folded into a summary
+    CHAT_MEMORY_ENABLED: bool = True
+    CHAT_MEMORY_POOL_SIZE: int = 5
+    CHAT_HISTORY_MAX_MESSAGES: int = 8
+    CHAT_HISTORY_MAX_TOKENS: int = 1500
+    # Conversations idle this long are deleted by the worker (history and the
+    # email excerpts carried in it). Conversations idle for over an hour keep
+    # only their latest checkpoint.
+    CHAT_MEMORY_RETENTION_DAYS: int = 30
+    # LLM gateway: calls in flight per process and how long a call may wait for
+    # a slot, the default per-call timeout and the deadline for a whole chat
+    # request, the fallback model used when the primary gives no first token
+    # within LLM_FALLBACK_AFTER_SECONDS (empty disables), and health caching
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    CHAT_DEADLINE_SECONDS: float = 45.0
+    LLM_FALLBACK_MODEL: str = "gpt-4o-mini"
+    LLM_FALLBACK_AFTER_SECONDS: float = 8.0
+    LLM_HEALTH_TTL_SECONDS: float = 30.0
+    LLM_HEALTH_TIMEOUT_SECONDS: float = 5.0
+    # RAG diagnostics: fraction of requests that also run Chroma counts, and
+    # how often the background task refreshes collection/user sizes (a few
+    # users per round, each count capped so one big mailbox stays cheap)
+    RAG_DIAG_SAMPLE_RATE: float = 0.0
+    VECTOR_STATS_REFRESH_SECONDS: float = 300.0
+    VECTOR_STATS_USERS_PER_REFRESH: int = 20
+    VECTOR_STATS_USER_SIZE_CAP: int = 10000
 
     # Task queue / Redis
     # Use 127.0.0.1 to avoid IPv6 localhost resolution issues on Windows
     REDIS_URL: str
     SYNC_LOCK_TTL_SECONDS: int
+    # Mailbox response cache; entries are also invalidated by generation bumps
+    MAIL_CACHE_TTL_SECONDS: int = 900
+    MAIL_CACHE_PREWARM_LIMIT: int = 20
+    # Change feed history kept for /mail/changes; older cursors must reload
+    CHANGE_LOG_RETENTION_DAYS: int = 14
+    # Push channel (/sync/events): events buffered per slow client before it is
+    # told to resync, and the keep-alive interval for idle connections
+    EVENTS_MAX_PENDING: int = 100
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    # Most threads one POST /mail/threads/batch call may request
+    THREAD_BATCH_MAX_IDS: int = 50
+    # Full-text search ranks at most this many of the newest matches
+    SEARCH_CANDIDATE_LIMIT: int = 1000
+    # Contact autocomplete: frecency half-life (applies to newly added points)
+    CONTACT_FRECENCY_HALF_LIFE_DAYS: float = 30.0
 
     # HTTP client settings for external calls (Aurinko)
     HTTP_CONNECT_TIMEOUT: float = 10.0
@@ -0,0 +1,36 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# DATABASE_URL is written for SQLAlchemy + asyncpg. Alembic (psycopg2) and the
+# chat checkpointer (psycopg 3) hand it to libpq, which rejects asyncpg-only
+# query parameters such as "ssl=require".
+
+_ASYNCPG_ONLY_PARAMS = {
+    "prepared_statement_cache_size",
+    "prepared_statement_name_func",
+    "statement_cache_size",
+    "max_cached_statement_lifetime",
+    "max_cacheable_statement_size",
+    "command_timeout",
+    "timeout",
+    "direct_tls",
+}
+
+
+def libpq_database_url(url: str) -> str:
+    """Plain postgresql:// URL with libpq-compatible query parameters."""
+    if url.startswith("postgresql+asyncpg://"):
+        url = url.replace("postgresql+asyncpg://", "postgresql://", 1)
+    parts = urlsplit(url)
+    qs = dict(parse_qsl(parts.query))
+    if "ssl" in qs:
+        val = (qs.pop("ssl") or "").lower()
+        if "sslmode" not in qs:
+            if val in ("true", "1", "require", "required"):
+                qs["sslmode"] = "require"
+            elif val in ("false", "0"):
+                qs["sslmode"] = "disable"
+            elif val:
+                qs["sslmode"] = val
+    for name in _ASYNCPG_ONLY_PARAMS:
+        qs.pop(name, None)
+    return urlunsplit(parts._replace(query=urlencode(qs)))
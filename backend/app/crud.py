@@ -4,18 +4,27 @@ from app.core.config import settings
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert
-from app.models import User, DbUser, DbEmailAddress, EmailLabel
+from app.models import User, DbUser, DbEmailAddress, DbEmailRecipient, EmailLabel, RecipientRole, FOLDER_FLAGS, SEARCH_CONFIG, SearchHit, Contact
 from app.logger_config import get_logger
-from app.models import DbEmail, DbThread, Email
+from app.models import DbEmail, DbThread, DbUserThread, DbThreadChange, Email, ThreadPage, ThreadChanges
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
 from sqlalchemy import select
 from app.models import DbUser, Email, Thread
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert
 from datetime import datetime
 from typing import Iterable
+import base64
+import math
+import html
+import json
 
 logger = get_logger(__name__)
 
+# Sender names kept on threads.participants for list views
+MAX_THREAD_PARTICIPANTS = 5
+
 
 async def upsert_user(*, session: AsyncSession, user: User) -> DbUser | None:
     # check if the user with given email exists
@@ -45,6 +54,9 @@ async def upsert_user(*, session: AsyncSession, user: User) -> DbUser | None:
             lastDeletedDeltaToken=user.lastDeletedDeltaToken,
         )
         session.add(new_user)
+        await session.flush()
+        # Threads already shared with this address become visible immediately
+        await backfill_user_threads(session, new_user.id)
         await session.commit()
         await session.refresh(new_user)
         logger.info(f"Inserted new user: {new_user}")
@@ -82,6 +94,177 @@ async def get_or_create_email_address(session: AsyncSession, address_dict: dict)
     return addr
 
 
+def user_id_subquery(user_email: str):
+    # Resolved once per statement (InitPlan); everything else hits user_threads
+    return select(DbUser.id).where(DbUser.email == user_email).scalar_subquery()
+
+
+def encode_cursor(last_message_date: datetime, thread_id: int) -> str:
+    """Opaque keyset cursor for (lastMessageDate, thread id)."""
+    raw = json.dumps({"d": last_message_date.isoformat(), "i": thread_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["d"]), int(data["i"])
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+async def get_thread_page(session: AsyncSession, user_email: str, limit: int, cursor: str | None = None) -> ThreadPage:
+    """Newest-first page of a user's threads with emails, keyed on user_threads order."""
+    query = (
+        select(DbThread, DbUserThread.lastMessageDate)
+        .join(DbUserThread, DbUserThread.thread_id == DbThread.id)
+        .where(DbUserThread.user_id == user_id_subquery(user_email))
+        .options(
+            selectinload(DbThread.emails).selectinload(
+                DbEmail.from_address),
+            selectinload(DbThread.emails).selectinload(
+                DbEmail.recipients)
+        )
+        .order_by(DbUserThread.lastMessageDate.desc(), DbUserThread.thread_id.desc())
+        # Fetch one extra row to know whether another page exists
+        .limit(limit + 1)
+    )
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(DbUserThread.lastMessageDate, DbUserThread.thread_id) < tuple_(last_date, last_id))
+
+    results = await session.execute(query)
+    rows = results.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # Cursor uses the projection's sort key so it matches the index order
+        tail_thread, tail_date = rows[-1]
+        next_cursor = encode_cursor(tail_date, tail_thread.id)
+    return ThreadPage(threads=[thread for thread, _ in rows], nextCursor=next_cursor)
+
+
+# Full-text search over the user's threads. Matches come from the GIN index;
+# only the most recent candidates are ranked, and snippets (the costly part)
+# are built for the returned page alone.
+_SEARCH_EMAILS = """
+    WITH q AS (SELECT {query} AS query),
+    candidates AS (
+        SELECT e.id, e."threadId", e.subject, e.body, e."sentAt", e."fromId",
+               ts_rank_cd(e."searchVector", q.query) AS rank
+        FROM emails e
+        CROSS JOIN q
+        JOIN user_threads ut ON ut.thread_id = e."threadId"
+        WHERE ut.user_id = (SELECT id FROM users WHERE email = :user_email)
+          AND e."searchVector" @@ q.query{filters}
+        ORDER BY e."sentAt" DESC
+        LIMIT :candidates
+    ),
+    page AS (
+        SELECT * FROM candidates
+        ORDER BY rank DESC, "sentAt" DESC
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT p.id, p."threadId", p.subject, p."sentAt", p.rank,
+           ea.name AS from_name, ea.address AS from_address,
+           ts_headline('{config}',
+                       coalesce(NULLIF(regexp_replace(left(p.body, 20000), '<[^>]*>', ' ', 'g'), ''),
+                                p.subject),
+                       q.query,
+                       'StartSel={start_sel}, StopSel={stop_sel}, MaxWords=35, MinWords=15, MaxFragments=2')
+               AS snippet
+    FROM page p
+    CROSS JOIN q
+    LEFT JOIN email_addresses ea ON ea.id = p."fromId"
+    ORDER BY p.rank DESC, p."sentAt" DESC
+"""
+
+# Bodies are HTML: tags are stripped before headlining, matches are marked with
+# plain-text sentinels, and the excerpt is escaped before they become <mark>
+_START_SEL = "[[hl]]"
+_STOP_SEL = "[[/hl]]"
+
+
+def _safe_snippet(raw: str) -> str:
+    text_only = html.unescape(raw)
+    return (html.escape(text_only, quote=False)
+            .replace(_START_SEL, "<mark>").replace(_STOP_SEL, "</mark>"))
+
+
+# Web-search syntax: every term must match
+_WEBSEARCH_QUERY = f"websearch_to_tsquery('{SEARCH_CONFIG}', :q)"
+# Any normalized term may match; used for natural-language questions from chat
+_ANY_TERM_QUERY = (
+    f"to_tsquery('{SEARCH_CONFIG}', array_to_string(ARRAY("
+    f"SELECT quote_literal(l) FROM unnest(tsvector_to_array(to_tsvector('{SEARCH_CONFIG}', :q))) l"
+    f"), ' | '))"
+)
+
+
+async def search_emails(
+    session: AsyncSession,
+    user_email: str,
+    q: str,
+    limit: int,
+    offset: int = 0,
+    *,
+    match_any: bool = False,
+    sent_after: datetime | None = None,
+    sent_before: datetime | None = None,
+    from_addresses: list[str] | None = None,
+    thread_id: int | None = None,
+) -> list[SearchHit]:
+    """Ranked full-text matches in the user's threads, with highlighted snippets.
+    Optional filters narrow by send date, sender address and thread.
+    """
+    if not q.strip():
+        return []
+    params: dict = {
+        "q": q,
+        "user_email": user_email,
+        "candidates": settings.SEARCH_CANDIDATE_LIMIT,
+        "limit": limit,
+        "offset": offset,
+    }
+    filters: list[str] = []
+    if sent_after is not None:
+        filters.append('e."sentAt" >= :sent_after')
+        params["sent_after"] = sent_after
+    if sent_before is not None:
+        filters.append('e."sentAt" < :sent_before')
+        params["sent_before"] = sent_before
+    if from_addresses:
+        filters.append('e."fromId" IN (SELECT id FROM email_addresses WHERE address = ANY(:from_addresses))')
+        params["from_addresses"] = from_addresses
+    if thread_id is not None:
+        filters.append('e."threadId" = :thread_id')
+        params["thread_id"] = thread_id
+    sql = _SEARCH_EMAILS.format(
+        query=_ANY_TERM_QUERY if match_any else _WEBSEARCH_QUERY,
+        filters="".join(f"\n          AND {f}" for f in filters),
+        config=SEARCH_CONFIG,
+        start_sel=_START_SEL,
+        stop_sel=_STOP_SEL,
+    )
+    result = await session.execute(text(sql), params)
+    return [
+        SearchHit(
+            emailId=row.id,
+            threadId=row.threadId,
+            subject=row.subject,
+            sentAt=row.sentAt,
+            fromName=row.from_name,
+            fromAddress=row.from_address,
+            rank=float(row.rank),
+            snippet=_safe_snippet(row.snippet or ""),
+        )
+        for row in result.all()
+    ]
+
+
 async def get_aurinko_token(session: AsyncSession, user_email: str) -> str:
     stmt = select(DbUser).where(DbUser.email == user_email)
     result = await session.execute(stmt)
@@ -100,6 +283,7 @@ async def get_or_create_thread(session: AsyncSession, record: dict) -> DbThread:
     received_at = parse_dt(record["receivedAt"])
 
     if thread:
+        is_newest = not received_at or received_at >= thread.lastMessageDate
         # Only update lastMessageDate if receivedAt is newer
         if received_at and received_at > thread.lastMessageDate:
             thread.lastMessageDate = received_at.replace(
@@ -108,9 +292,9 @@ async def get_or_create_thread(session: AsyncSession, record: dict) -> DbThread:
         if thread.subject != record["subject"]:
             thread.subject = record["subject"]
 
-        # Update brief with bodySnippet
+        # Brief mirrors the newest message's bodySnippet
         body_snippet = record.get("bodySnippet", "Default Brief")
-        if thread.brief != body_snippet:
+        if is_newest and thread.brief != body_snippet:
             thread.brief = body_snippet
 
         return thread
@@ -127,7 +311,8 @@ async def get_or_create_thread(session: AsyncSession, record: dict) -> DbThread:
     return thread
 
 
-async def upsert_record(session: AsyncSession, record: dict, body: str | None = None) -> None:
+async def upsert_record(session: AsyncSession, record: dict, body: str | None = None) -> bool:
+    """Insert one provider record; returns True if a new email row was added."""
     # Handle None case for from address
     from_data = None
     if record.get("from"):
@@ -149,7 +334,7 @@ async def upsert_record(session: AsyncSession, record: dict, body: str | None =
 
     if existing_email:
         # Skip or update fields as needed
-        return
+        return False
 
     # Fix emailLabel - don't access array index if it might be empty
     sys_classifications = record.get("sysClassifications", [])
@@ -158,7 +343,7 @@ async def upsert_record(session: AsyncSession, record: dict, body: str | None =
     if from_data is None:
         logger.warning(
             f"No from address found for email {record['id']}, skipping...")
-        return
+        return False
 
     email = DbEmail(
         id=int(record["id"], 16),  # Convert hex string to int
@@ -176,12 +361,17 @@ async def upsert_record(session: AsyncSession, record: dict, body: str | None =
         threadIndex=record.get("threadIndex")
     )
 
-    # Filter out None values before setting relationships
-    email.to_addresses = [addr for addr in to_addrs if addr is not None]
-    email.cc_addresses = [addr for addr in cc_addrs if addr is not None]
-    email.bcc_addresses = [addr for addr in bcc_addrs if addr is not None]
-    email.reply_to_addresses = [
-        addr for addr in reply_to_addrs if addr is not None]
+    # One row per recipient, keeping each header's order; skip None values
+    email.recipients = [
+        DbEmailRecipient(role=role, position=position, address=addr)
+        for role, addrs in (
+            (RecipientRole.to, to_addrs),
+            (RecipientRole.cc, cc_addrs),
+            (RecipientRole.bcc, bcc_addrs),
+            (RecipientRole.reply_to, reply_to_addrs),
+        )
+        for position, addr in enumerate(a for a in addrs if a is not None)
+    ]
 
     # Add addresses to thread access using explicit SQL to avoid lazy loading issues
     access_addresses = set([from_data] + to_addrs +
@@ -205,21 +395,247 @@ async def upsert_record(session: AsyncSession, record: dict, body: str | None =
             )
 
     session.add(email)
+    return True
+
+
+# Upsert the user_threads projection from the address-based access rows.
+# Any registered user whose address has access to the thread gets a row.
+_USER_THREADS_UPSERT = """
+    INSERT INTO user_threads (user_id, thread_id, "lastMessageDate", done,
+                              "inboxStatus", "draftStatus", "sentStatus")
+    SELECT u.id, t.id, t."lastMessageDate", t.done,
+           t."inboxStatus", t."draftStatus", t."sentStatus"
+    FROM threads t
+    JOIN address_has_threads aht ON aht.thread_id = t.id
+    JOIN email_addresses ea ON ea.id = aht.address_id
+    JOIN users u ON u.email = ea.address
+    WHERE {where}
+    ON CONFLICT (user_id, thread_id) DO UPDATE SET
+        "lastMessageDate" = EXCLUDED."lastMessageDate",
+        done = EXCLUDED.done,
+        "inboxStatus" = EXCLUDED."inboxStatus",
+        "draftStatus" = EXCLUDED."draftStatus",
+        "sentStatus" = EXCLUDED."sentStatus"
+    RETURNING user_id, thread_id
+"""
+
+
+# Assign each (user, thread) change the user's next sequence number. The
+# UPDATE on users takes the row lock, so sequences commit in order per user.
+# thread_changes keeps only the latest change per thread (compaction).
+_RECORD_THREAD_CHANGES = """
+    WITH changes AS (
+        SELECT c.user_id, c.thread_id,
+               row_number() OVER (PARTITION BY c.user_id ORDER BY c.thread_id) AS n
+        FROM unnest(CAST(:user_ids AS int[]), CAST(:thread_ids AS bigint[]))
+             AS c(user_id, thread_id)
+    ),
+    per_user AS (
+        SELECT user_id, count(*) AS n FROM changes GROUP BY user_id
+    ),
+    bumped AS (
+        UPDATE users u SET "changeSeq" = u."changeSeq" + p.n
+        FROM per_user p
+        WHERE u.id = p.user_id
+        RETURNING u.id AS user_id, u."changeSeq" - p.n AS base
+    )
+    INSERT INTO thread_changes (user_id, thread_id, seq, op, "changedAt")
+    SELECT c.user_id, c.thread_id, b.base + c.n, :op, :now
+    FROM changes c JOIN bumped b ON b.user_id = c.user_id
+    ON CONFLICT (user_id, thread_id) DO UPDATE SET
+        seq = EXCLUDED.seq, op = EXCLUDED.op, "changedAt" = EXCLUDED."changedAt"
+"""
+
+
+async def record_thread_changes(session: AsyncSession, pairs: Iterable[tuple[int, int]], op: str) -> None:
+    """Append (user_id, thread_id) changes to the per-user change feed."""
+    unique = sorted(set(pairs))
+    if not unique:
+        return
+    await session.execute(
+        text(_RECORD_THREAD_CHANGES),
+        {
+            "user_ids": [p[0] for p in unique],
+            "thread_ids": [p[1] for p in unique],
+            "op": op,
+            "now": datetime.utcnow(),
+        },
+    )
+
+
+async def refresh_user_threads(session: AsyncSession, thread_ids: Iterable[int]) -> None:
+    """Bring user_threads rows for the given threads in line with threads/address_has_threads."""
+    ids = list(set(thread_ids))
+    if not ids:
+        return
+    await session.flush()
+    result = await session.execute(
+        text(_USER_THREADS_UPSERT.format(where="t.id = ANY(:thread_ids)")),
+        {"thread_ids": ids},
+    )
+    await record_thread_changes(session, result.all(), "upsert")
+
+
+async def backfill_user_threads(session: AsyncSession, user_id: int) -> None:
+    """Populate user_threads for a user whose address already has thread access."""
+    await session.execute(
+        text(_USER_THREADS_UPSERT.format(where="u.id = :user_id")),
+        {"user_id": user_id},
+    )
+
+
+# Frecency points are ln(weight) + rate * days since a fixed epoch, summed in
+# log space (log-sum-exp) so older contacts decay relative to newer ones without
+# rewriting rows. Mail a user sends counts double compared to mail received.
+# Changing the half-life only affects points added afterwards.
+_CONTACT_FRECENCY_UPSERT = """
+    WITH new AS (
+        SELECT e.id, e."fromId", e."sentAt" FROM emails e WHERE {where}
+    ),
+    edges AS (
+        SELECT u.id AS user_id, r.address_id, n.id AS email_id, n."sentAt", 2.0 AS weight
+        FROM new n
+        JOIN email_addresses fa ON fa.id = n."fromId"
+        JOIN users u ON u.email = fa.address
+        JOIN email_recipients r ON r.email_id = n.id
+        WHERE r.address_id <> n."fromId"
+        UNION
+        SELECT u.id, n."fromId", n.id, n."sentAt", 1.0
+        FROM new n
+        JOIN email_recipients r ON r.email_id = n.id
+        JOIN email_addresses ra ON ra.id = r.address_id
+        JOIN users u ON u.email = ra.address
+        WHERE r.address_id <> n."fromId"
+    ),
+    points AS (
+        SELECT user_id, address_id, "sentAt",
+               ln(weight) + :rate * extract(epoch FROM "sentAt" - TIMESTAMP '2020-01-01') / 86400.0 AS v
+        FROM edges
+    ),
+    peaks AS (
+        SELECT *, max(v) OVER (PARTITION BY user_id, address_id) AS m FROM points
+    )
+    INSERT INTO user_contacts (user_id, address_id, score, "messageCount", "lastContactAt")
+    SELECT user_id, address_id, m + ln(sum(exp(v - m))), count(*), max("sentAt")
+    FROM peaks
+    GROUP BY user_id, address_id, m
+    ON CONFLICT (user_id, address_id) DO UPDATE SET
+        score = GREATEST(user_contacts.score, EXCLUDED.score)
+              + ln(1 + exp(-abs(user_contacts.score - EXCLUDED.score))),
+        "messageCount" = user_contacts."messageCount" + EXCLUDED."messageCount",
+        "lastContactAt" = GREATEST(user_contacts."lastContactAt", EXCLUDED."lastContactAt")
+"""
+
+
+def contact_frecency_rate() -> float:
+    return math.log(2) / settings.CONTACT_FRECENCY_HALF_LIFE_DAYS
+
+
+async def update_contact_frecency(session: AsyncSession, email_ids: list[int]) -> None:
+    """Credit the senders/recipients of newly stored emails to each registered participant."""
+    if not email_ids:
+        return
+    await session.flush()
+    await session.execute(
+        text(_CONTACT_FRECENCY_UPSERT.format(where="e.id = ANY(:ids)")),
+        {"ids": email_ids, "rate": contact_frecency_rate()},
+    )
+
+
+def escape_like(q: str) -> str:
+    return q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search_contacts(session: AsyncSession, user_email: str, q: str, limit: int) -> list[Contact]:
+    """Autocomplete over the user's own contacts; prefix matches first, then frecency."""
+    q = q.strip().lower()
+    if not q:
+        return []
+    pattern = escape_like(q)
+    result = await session.execute(
+        text("""
+            SELECT ea.address, ea.name, uc."lastContactAt"
+            FROM user_contacts uc
+            JOIN email_addresses ea ON ea.id = uc.address_id
+            WHERE uc.user_id = (SELECT id FROM users WHERE email = :user_email)
+              AND (ea.address ILIKE :contains OR ea.name ILIKE :contains)
+            ORDER BY (ea.address ILIKE :prefix OR ea.name ILIKE :prefix) DESC,
+                     uc.score DESC
+            LIMIT :limit
+        """),
+        {
+            "user_email": user_email,
+            "contains": f"%{pattern}%",
+            "prefix": f"{pattern}%",
+            "limit": limit,
+        },
+    )
+    return [
+        Contact(address=row.address, name=row.name, lastContactAt=row.lastContactAt)
+        for row in result.all()
+    ]
+
+
+async def reconcile_folder_counts(session: AsyncSession, user_id: int) -> int:
+    """Recompute a user's folder counters from user_threads, fixing any drift.
+    Counter rows are locked first so trigger updates from a concurrent sync
+    wait for (and are not lost to) the recount. Returns rows corrected.
+    """
+    folders = list(FOLDER_FLAGS)
+    await session.execute(
+        text("""
+            INSERT INTO user_folder_counts (user_id, folder, total, open)
+            SELECT :user_id, f, 0, 0 FROM unnest(CAST(:folders AS text[])) AS f
+            ON CONFLICT DO NOTHING
+        """),
+        {"user_id": user_id, "folders": folders},
+    )
+    await session.execute(
+        text("SELECT 1 FROM user_folder_counts WHERE user_id = :user_id FOR UPDATE"),
+        {"user_id": user_id},
+    )
+    flag_cases = ", ".join(
+        f"('{folder}', ut.\"{column}\")" for folder, column in FOLDER_FLAGS.items())
+    result = await session.execute(
+        text(f"""
+            WITH actual AS (
+                SELECT f.folder, count(*) AS total,
+                       count(*) FILTER (WHERE NOT ut.done) AS open
+                FROM user_threads ut
+                CROSS JOIN LATERAL (VALUES {flag_cases}) AS f(folder, flag)
+                WHERE ut.user_id = :user_id AND f.flag
+                GROUP BY f.folder
+            )
+            UPDATE user_folder_counts c
+            SET total = COALESCE(a.total, 0), open = COALESCE(a.open, 0)
+            FROM user_folder_counts c2
+            LEFT JOIN actual a ON a.folder = c2.folder
+            WHERE c.user_id = :user_id
+              AND c2.user_id = c.user_id AND c2.folder = c.folder
+              AND (c.total <> COALESCE(a.total, 0) OR c.open <> COALESCE(a.open, 0))
+        """),
+        {"user_id": user_id},
+    )
+    await session.commit()
+    return result.rowcount or 0
 
 
-async def sync_emails_and_threads(session: AsyncSession, records: list[dict], user: DbUser | None = None, account_token: str | None = None) -> None:
+async def sync_emails_and_threads(session: AsyncSession, records: list[dict], user: DbUser | None = None, account_token: str | None = None) -> set[int]:
     """
     Sync emails and threads using the new logic that properly handles addresses_with_access.
     This replaces the old bulk upsert approach with a record-by-record approach that 
     manages email addresses and thread access relationships.
+    Returns the ids of threads that were written.
     """
     if not records:
         logger.info("No records to sync.")
-        return
+        return set()
 
     logger.info(f"Starting sync of {len(records)} email records...")
 
     processed_count = 0
+    touched_thread_ids: set[int] = set()
+    new_email_ids: list[int] = []
     # Build HTTP config once and reuse a single AsyncClient across records to leverage connection pooling
     limits = httpx.Limits(
         max_connections=settings.HTTP_MAX_CONNECTIONS,
@@ -268,7 +684,9 @@ async def sync_emails_and_threads(session: AsyncSession, records: list[dict], us
                         logger.error(
                             f"Failed to fetch body for email {record['id']}: {response.text}")
                         continue
-                await upsert_record(session, record, body=record.get("body"))
+                if await upsert_record(session, record, body=record.get("body")):
+                    new_email_ids.append(int(record["id"], 16))
+                touched_thread_ids.add(int(record["threadId"], 16))
                 processed_count += 1
             except Exception as e:
                 # Roll back this failed record so the session can proceed
@@ -280,16 +698,129 @@ async def sync_emails_and_threads(session: AsyncSession, records: list[dict], us
                     f"Failed to process record {record.get('id', 'unknown')}: {e}")
                 continue
 
+    # List-view summaries (messageCount, participants) are rebuilt from the
+    # emails with the same rule deletes use, not patched per record
+    await session.flush()
+    await recompute_thread_summaries(session, list(touched_thread_ids))
+    # Keep the per-user inbox projection in step with the threads just written
+    await refresh_user_threads(session, touched_thread_ids)
+    await update_contact_frecency(session, new_email_ids)
     # Commit all changes at the end
     await session.commit()
     logger.info(
         f"Successfully synced {processed_count} email records with their threads and address relationships.")
+    return touched_thread_ids
+
+
+async def user_emails_for_threads(session: AsyncSession, thread_ids: Iterable[int]) -> list[str]:
+    """Emails of registered users who see, or just lost, any of the given threads.
+    Read from the change log so users whose thread was removed are included.
+    """
+    ids = list(set(thread_ids))
+    if not ids:
+        return []
+    result = await session.execute(
+        select(DbUser.email)
+        .join(DbThreadChange, DbThreadChange.user_id == DbUser.id)
+        .where(DbThreadChange.thread_id.in_(ids))
+        .distinct()
+    )
+    return list(result.scalars().all())
+
+
+async def recompute_thread_summaries(session: AsyncSession, thread_ids: list[int]) -> None:
+    """Recount messageCount and rebuild participants for threads from their emails.
+    Participants are sender labels (name, else address), most recently sent first.
+    """
+    if not thread_ids:
+        return
+    await session.execute(
+        text("""
+            UPDATE threads t SET "messageCount" =
+                (SELECT count(*) FROM emails e WHERE e."threadId" = t.id)
+            WHERE t.id = ANY(:ids)
+        """),
+        {"ids": thread_ids},
+    )
+    await session.execute(
+        text("""
+            UPDATE threads t SET participants = COALESCE((
+                SELECT (array_agg(s.label ORDER BY s.last_sent DESC, s.label))[1:CAST(:n AS int)]
+                FROM (
+                    SELECT COALESCE(NULLIF(ea.name, ''), ea.address) AS label,
+                           max(e."sentAt") AS last_sent
+                    FROM emails e
+                    JOIN email_addresses ea ON ea.id = e."fromId"
+                    WHERE e."threadId" = t.id
+                    GROUP BY 1
+                ) s
+            ), '{}')
+            WHERE t.id = ANY(:ids)
+        """),
+        {"ids": thread_ids, "n": MAX_THREAD_PARTICIPANTS},
+    )
+
+
+async def get_thread_changes(session: AsyncSession, user_email: str, since: int | None, limit: int) -> ThreadChanges:
+    """Threads upserted/deleted for a user after sequence `since`, oldest first."""
+    user = (await session.execute(
+        select(DbUser.id, DbUser.changeSeq, DbUser.changeSeqFloor)
+        .where(DbUser.email == user_email)
+    )).first()
+    if user is None:
+        return ThreadChanges(cursor="0")
+    if since is None:
+        # No cursor yet: hand out the current position to start following from
+        return ThreadChanges(cursor=str(user.changeSeq))
+    if since < user.changeSeqFloor:
+        return ThreadChanges(cursor=str(user.changeSeq), reset=True)
+
+    rows = (await session.execute(
+        select(DbThreadChange.thread_id, DbThreadChange.seq, DbThreadChange.op)
+        .where(DbThreadChange.user_id == user.id, DbThreadChange.seq > since)
+        .order_by(DbThreadChange.seq)
+        .limit(limit + 1)
+    )).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    page = ThreadChanges(
+        cursor=str(rows[-1].seq if rows else max(since, 0)),
+        hasMore=has_more,
+    )
+    for row in rows:
+        target = page.deleted if row.op == "delete" else page.upserted
+        target.append(format(row.thread_id, "x"))
+    return page
+
+
+async def prune_thread_changes(session: AsyncSession, older_than: datetime) -> int:
+    """Drop change-log rows older than the cutoff and raise each user's floor.
+    Clients whose cursor is below the floor get `reset` and reload.
+    """
+    result = await session.execute(
+        text("""
+            WITH pruned AS (
+                DELETE FROM thread_changes WHERE "changedAt" < :cutoff
+                RETURNING user_id, seq
+            ), floors AS (
+                SELECT user_id, max(seq) AS floor, count(*) AS n
+                FROM pruned GROUP BY user_id
+            )
+            UPDATE users u SET "changeSeqFloor" = GREATEST(u."changeSeqFloor", f.floor)
+            FROM floors f WHERE u.id = f.user_id
+            RETURNING f.n
+        """),
+        {"cutoff": older_than},
+    )
+    pruned = sum(row[0] for row in result.all())
+    await session.commit()
+    return pruned
 
 
-async def delete_emails_by_ids(session: AsyncSession, ids: Iterable[str]) -> int:
+async def delete_emails_by_ids(session: AsyncSession, ids: Iterable[str], thread_ids_out: set[int] | None = None) -> int:
     """Delete emails (and optionally cleanup) by provider ids that come from Aurinko.
     Incoming ids are hex strings; map to integer primary keys.
-    Returns number of emails deleted.
+    Returns number of emails deleted; affected thread ids are added to thread_ids_out.
     """
     # Convert to integer IDs and deduplicate
     int_ids = []
@@ -304,10 +835,29 @@ async def delete_emails_by_ids(session: AsyncSession, ids: Iterable[str]) -> int
         return 0
 
     # Delete emails by primary key; rely on ON DELETE constraints for FKs if configured
-    await session.execute(
-        text("DELETE FROM emails WHERE id = ANY(:ids)"),
+    result = await session.execute(
+        text('DELETE FROM emails WHERE id = ANY(:ids) RETURNING "threadId"'),
         {"ids": int_ids},
     )
+    thread_ids = list({row[0] for row in result.all()})
+    if thread_ids_out is not None:
+        thread_ids_out.update(thread_ids)
+    await recompute_thread_summaries(session, thread_ids)
+    # Threads left without messages drop out of every mailbox; the rest refresh
+    if thread_ids:
+        removed = await session.execute(
+            text("""
+                DELETE FROM user_threads ut USING threads t
+                WHERE t.id = ut.thread_id AND t.id = ANY(:ids)
+                  AND t."messageCount" = 0
+                RETURNING ut.user_id, ut.thread_id
+            """),
+            {"ids": thread_ids},
+        )
+        removed_pairs = removed.all()
+        await record_thread_changes(session, removed_pairs, "delete")
+        emptied = {pair[1] for pair in removed_pairs}
+        await refresh_user_threads(session, [t for t in thread_ids if t not in emptied])
     await session.commit()
     logger.info(f"Deleted {len(int_ids)} emails from database")
     return len(int_ids)
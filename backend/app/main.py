@@ -8,8 +8,17 @@ import redis.asyncio as redis
 from contextlib import asynccontextmanager
 from sqlalchemy import text
 from app.core.db import engine
+from app.services.vector_store import close_vector_stores
+from app.services.blocking import shutdown_executor
+from app.services.rag_metrics import refresh_vector_stats_forever
+from app.services.mail_events import EventHub
+from app.services.chat_graph import build_chat_graph
+from app.services.chat_memory import ChatMemory
+from app.logger_config import get_logger
+import asyncio
 
 setup_logging()
+logger = get_logger(__name__)
 
 
 @asynccontextmanager
@@ -26,9 +35,35 @@ async def lifespan(app: FastAPI):
         app.state.arq = None
         app.state.redis = None
 
+    app.state.events = None
+    if app.state.redis is not None:
+        app.state.events = EventHub(app.state.redis)
+        app.state.events.start()
+
+    # Chat graph with a Postgres checkpointer for multi-turn memory; without it
+    # the routes use the stateless module-level graph
+    app.state.chat_memory = None
+    app.state.chat_app = None
+    if settings.CHAT_MEMORY_ENABLED:
+        memory = ChatMemory()
+        try:
+            await memory.start()
+            app.state.chat_memory = memory
+            app.state.chat_app = build_chat_graph(checkpointer=memory.saver)
+        except Exception as e:
+            logger.warning("Chat memory unavailable, chat will be stateless: %s", e)
+            await memory.stop()
+
+    stats_task = asyncio.create_task(refresh_vector_stats_forever())
+
     try:
         yield
     finally:
+        stats_task.cancel()
+        if app.state.events is not None:
+            await app.state.events.stop()
+        if app.state.chat_memory is not None:
+            await app.state.chat_memory.stop()
         if getattr(app.state, "arq", None):
             await app.state.arq.close()
         if getattr(app.state, "redis", None):
@@ -36,6 +71,8 @@ async def lifespan(app: FastAPI):
                 await app.state.redis.aclose()
             except Exception:
                 pass
+        await close_vector_stores()
+        shutdown_executor()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, relationship
-from sqlalchemy import String, Integer, BigInteger, Boolean, DateTime, Text, Table, Column, ForeignKey, Index
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import String, Integer, BigInteger, Boolean, Float, DateTime, Text, Table, Column, ForeignKey, Index, DDL, event, Computed
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from pydantic import BaseModel, ConfigDict, field_serializer, field_validator
 from datetime import datetime
 from typing import Optional, List, Dict, Any
@@ -24,6 +24,22 @@ class EmailLabel(str, Enum):
     trash = "trash"
 
 
+# Text search configuration used by the emails search vector and its queries
+SEARCH_CONFIG = 'english'
+# Subject weighs more than body; bodies are capped to stay under the tsvector size limit
+EMAIL_SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(subject, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', left(coalesce(body, ''), 200000)), 'B')"
+)
+
+
+class RecipientRole(str, Enum):
+    to = "to"
+    cc = "cc"
+    bcc = "bcc"
+    reply_to = "reply_to"
+
+
 class DbUser(Base):
     __tablename__ = 'users'
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -37,6 +53,12 @@ class DbUser(Base):
     passwordHash: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     syncDaysWithin: Mapped[Optional[int]] = mapped_column(
         Integer, nullable=True)
+    # Change feed: last sequence issued to this user, and the highest sequence
+    # pruned by retention (clients behind it must reload)
+    changeSeq: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default='0')
+    changeSeqFloor: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default='0')
 
     def __repr__(self):
         return (
@@ -52,42 +74,18 @@ class DbEmailAddress(Base):
     address: Mapped[str] = mapped_column(String, nullable=False, unique=True)
     name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
 
+    # Trigram indexes back substring matching in contact autocomplete
+    __table_args__ = (
+        Index('ix_email_addresses_address_trgm', 'address',
+              postgresql_using='gin', postgresql_ops={'address': 'gin_trgm_ops'}),
+        Index('ix_email_addresses_name_trgm', 'name',
+              postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
     def __repr__(self):
         return f"<DbEmailAddress(id={self.id}, address={self.address}, name={self.name})>"
 
 
-email_to_addresses = Table(
-    'email_to_addresses',
-    Base.metadata,
-    Column('email_id', BigInteger, ForeignKey('emails.id'), primary_key=True),
-    Column('address_id', Integer, ForeignKey(
-        'email_addresses.id'), primary_key=True)
-)
-
-email_cc_addresses = Table(
-    'email_cc_addresses',
-    Base.metadata,
-    Column('email_id', BigInteger, ForeignKey('emails.id'), primary_key=True),
-    Column('address_id', Integer, ForeignKey(
-        'email_addresses.id'), primary_key=True)
-)
-
-email_bcc_addresses = Table(
-    'email_bcc_addresses',
-    Base.metadata,
-    Column('email_id', BigInteger, ForeignKey('emails.id'), primary_key=True),
-    Column('address_id', Integer, ForeignKey(
-        'email_addresses.id'), primary_key=True)
-)
-
-email_reply_to_addresses = Table(
-    'email_reply_to_addresses',
-    Base.metadata,
-    Column('email_id', BigInteger, ForeignKey('emails.id'), primary_key=True),
-    Column('address_id', Integer, ForeignKey(
-        'email_addresses.id'), primary_key=True)
-)
-
 address_has_threads = Table(
     'address_has_threads',
     Base.metadata,
@@ -110,6 +108,12 @@ class DbThread(Base):
     inboxStatus: Mapped[bool] = mapped_column(Boolean, default=True)
     draftStatus: Mapped[bool] = mapped_column(Boolean, default=False)
     sentStatus: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Denormalized for list views so they never have to load emails
+    messageCount: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default='0')
+    # Most recent distinct sender display names, newest first
+    participants: Mapped[List[str]] = mapped_column(
+        ARRAY(String), nullable=False, default=list, server_default='{}')
 
     # Relationships
     emails = relationship("DbEmail", back_populates="thread")
@@ -128,6 +132,152 @@ class DbThread(Base):
     )
 
 
+class DbUserThread(Base):
+    """Per-user projection of thread membership, maintained by ingestion.
+    Lets inbox reads scan one (user_id, lastMessageDate) index instead of
+    joining threads -> address_has_threads -> email_addresses.
+    """
+    __tablename__ = 'user_threads'
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    thread_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey('threads.id', ondelete='CASCADE'), primary_key=True)
+    lastMessageDate: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    done: Mapped[bool] = mapped_column(Boolean, default=False)
+    inboxStatus: Mapped[bool] = mapped_column(Boolean, default=True)
+    draftStatus: Mapped[bool] = mapped_column(Boolean, default=False)
+    sentStatus: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    __table_args__ = (
+        # Scanned backwards for newest-first listing and keyset pagination
+        Index('ix_user_threads_user_last_message',
+              'user_id', 'lastMessageDate', 'thread_id'),
+    )
+
+
+class DbThreadChange(Base):
+    """Compact per-user change log: the latest change to each thread, ordered by seq."""
+    __tablename__ = 'thread_changes'
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    thread_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # 'upsert' or 'delete'
+    op: Mapped[str] = mapped_column(String, nullable=False)
+    changedAt: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_thread_changes_user_seq', 'user_id', 'seq'),
+        Index('ix_thread_changes_changed_at', 'changedAt'),
+    )
+
+
+class ThreadChanges(BaseModel):
+    cursor: str
+    upserted: List[str] = []
+    deleted: List[str] = []
+    hasMore: bool = False
+    # True when `since` is older than retained history; reload the list
+    reset: bool = False
+
+
+class DbUserFolderCount(Base):
+    """Per-user, per-folder thread counters kept in step with user_threads by a trigger."""
+    __tablename__ = 'user_folder_counts'
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    folder: Mapped[str] = mapped_column(String, primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Threads in the folder that are not marked done
+    open: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+# Folder name -> user_threads flag column; shared by the trigger and reconciliation
+FOLDER_FLAGS = {
+    "inbox": "inboxStatus",
+    "draft": "draftStatus",
+    "sent": "sentStatus",
+}
+
+# One statement per entry so drivers that prepare statements (asyncpg) accept them
+USER_FOLDER_COUNTS_TRIGGER_DDL = [
+    """
+CREATE OR REPLACE FUNCTION bump_user_folder_counts(
+    p_user_id integer, p_inbox boolean, p_draft boolean, p_sent boolean,
+    p_done boolean, p_delta integer
+) RETURNS void AS $$
+BEGIN
+    INSERT INTO user_folder_counts (user_id, folder, total, open)
+    SELECT p_user_id, f.folder, p_delta, CASE WHEN p_done THEN 0 ELSE p_delta END
+    FROM (VALUES ('inbox', p_inbox), ('draft', p_draft), ('sent', p_sent)) AS f(folder, flag)
+    WHERE f.flag
+    ON CONFLICT (user_id, folder) DO UPDATE SET
+        total = user_folder_counts.total + EXCLUDED.total,
+        open = user_folder_counts.open + EXCLUDED.open;
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION user_threads_folder_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD."inboxStatus" IS NOT DISTINCT FROM NEW."inboxStatus"
+       AND OLD."draftStatus" IS NOT DISTINCT FROM NEW."draftStatus"
+       AND OLD."sentStatus" IS NOT DISTINCT FROM NEW."sentStatus"
+       AND OLD.done IS NOT DISTINCT FROM NEW.done THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_user_folder_counts(OLD.user_id, OLD."inboxStatus", OLD."draftStatus",
+                                        OLD."sentStatus", OLD.done, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_user_folder_counts(NEW.user_id, NEW."inboxStatus", NEW."draftStatus",
+                                        NEW."sentStatus", NEW.done, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE TRIGGER trg_user_threads_folder_counts
+AFTER INSERT OR UPDATE OR DELETE ON user_threads
+FOR EACH ROW EXECUTE FUNCTION user_threads_folder_counts()
+""",
+]
+
+# Keep create_all() databases (init_db) equivalent to the migrated schema;
+# metadata-level so user_threads and user_folder_counts both exist first
+for _stmt in USER_FOLDER_COUNTS_TRIGGER_DDL:
+    event.listen(Base.metadata, "after_create",
+                 DDL(_stmt).execute_if(dialect="postgresql"))
+
+
+# gin_trgm_ops needs the extension before the address indexes are created
+event.listen(Base.metadata, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+
+class DbUserContact(Base):
+    """Addresses a user has exchanged mail with, ranked for autocomplete.
+    score is a log-space frecency: each message adds exp(rate * age_days) and
+    the sum is stored as a log, so scores compare without periodic decay.
+    """
+    __tablename__ = 'user_contacts'
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    address_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('email_addresses.id', ondelete='CASCADE'), primary_key=True)
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+    messageCount: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default='0')
+    lastContactAt: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_user_contacts_user_score', 'user_id', 'score'),
+    )
+
+
 class DbEmail(Base):
     __tablename__ = 'emails'
     id: Mapped[int] = mapped_column(
@@ -147,6 +297,9 @@ class DbEmail(Base):
     emailLabel: Mapped[EmailLabel] = mapped_column(
         String, default=EmailLabel.inbox)
     threadIndex: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Generated by Postgres from subject/body, so every write path keeps it current
+    searchVector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR, Computed(EMAIL_SEARCH_VECTOR_SQL, persisted=True), deferred=True)
     # Relationships
     thread = relationship("DbThread", back_populates="emails")
     from_address = relationship(
@@ -154,31 +307,39 @@ class DbEmail(Base):
         foreign_keys=[fromId],
         lazy="selectin",
     )
-    to_addresses = relationship(
-        "DbEmailAddress",
-        secondary=email_to_addresses,
-        lazy="selectin"
-    )
-    cc_addresses = relationship(
-        "DbEmailAddress",
-        secondary=email_cc_addresses,
-        lazy="selectin"
-    )
-    bcc_addresses = relationship(
-        "DbEmailAddress",
-        secondary=email_bcc_addresses,
-        lazy="selectin"
-    )
-    reply_to_addresses = relationship(
-        "DbEmailAddress",
-        secondary=email_reply_to_addresses,
-        lazy="selectin"
+    # All recipient roles live in one table so a list of emails loads its
+    # recipients (with addresses joined) in a single query, in header order
+    recipients = relationship(
+        "DbEmailRecipient",
+        lazy="selectin",
+        cascade="all, delete-orphan",
+        order_by="(DbEmailRecipient.role, DbEmailRecipient.position)",
     )
 
+    def _role_addresses(self, role: str) -> list["DbEmailAddress"]:
+        return [r.address for r in self.recipients if r.role == role]
+
+    @property
+    def to_addresses(self) -> list["DbEmailAddress"]:
+        return self._role_addresses(RecipientRole.to)
+
+    @property
+    def cc_addresses(self) -> list["DbEmailAddress"]:
+        return self._role_addresses(RecipientRole.cc)
+
+    @property
+    def bcc_addresses(self) -> list["DbEmailAddress"]:
+        return self._role_addresses(RecipientRole.bcc)
+
+    @property
+    def reply_to_addresses(self) -> list["DbEmailAddress"]:
+        return self._role_addresses(RecipientRole.reply_to)
+
     __table_args__ = (
         Index('ix_emails_thread_id', 'threadId'),
         Index('ix_emails_email_label', 'emailLabel'),
         Index('ix_emails_sent_at', 'sentAt'),
+        Index('ix_emails_search_vector', 'searchVector', postgresql_using='gin'),
     )
 
     # might be useful in the future
@@ -202,6 +363,22 @@ class DbEmail(Base):
     # references: Mapped[Optional[str]] = mapped_column(String, nullable=True)
 
 
+class DbEmailRecipient(Base):
+    __tablename__ = 'email_recipients'
+    email_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey('emails.id', ondelete='CASCADE'), primary_key=True)
+    role: Mapped[RecipientRole] = mapped_column(String, primary_key=True)
+    # Index within the role's header list, preserving the original order
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)
+    address_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey('email_addresses.id'), nullable=False)
+    address = relationship("DbEmailAddress", lazy="joined", innerjoin=True)
+
+    __table_args__ = (
+        Index('ix_email_recipients_address_id', 'address_id'),
+    )
+
+
 # Pydantic Models
 class User(BaseModel):
     id: Optional[int] = None  # Auto-generated, so optional for creation
@@ -262,6 +439,76 @@ class Thread(BaseModel):
         return format(v, 'x')
 
 
+class ThreadSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    subject: str
+    lastMessageDate: datetime
+    done: bool = False
+    brief: str
+    inboxStatus: bool = True
+    draftStatus: bool = False
+    sentStatus: bool = False
+    messageCount: int = 0
+    participants: List[str] = []
+
+    @field_serializer("id")
+    def _id_to_str(self, v, _):
+        return format(v, 'x')
+
+
+class ThreadSummaryPage(BaseModel):
+    threads: List[ThreadSummary] = []
+    nextCursor: Optional[str] = None
+
+
+class ThreadPage(BaseModel):
+    threads: List[Thread] = []
+    # Opaque cursor for the next page; None when there are no more threads
+    nextCursor: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    emailId: int
+    threadId: int
+    subject: str
+    sentAt: datetime
+    fromName: Optional[str] = None
+    fromAddress: Optional[str] = None
+    rank: float
+    # Plain-text body excerpt, HTML-escaped; the only markup is <mark>...</mark>
+    # around matches, so it is safe to render as HTML
+    snippet: str
+
+    @field_serializer("emailId", "threadId")
+    def _id_to_str(self, v, _):
+        return format(v, 'x')
+
+
+class SearchResults(BaseModel):
+    query: str
+    hits: List[SearchHit] = []
+
+
+class Contact(BaseModel):
+    address: str
+    name: Optional[str] = None
+    lastContactAt: datetime
+
+
+class ThreadBatchRequest(BaseModel):
+    # Hex ids as returned by the API (plain integers are accepted too)
+    ids: List[str | int]
+
+
+class ThreadBatch(BaseModel):
+    # Found threads, in the order they were requested
+    threads: List[Thread] = []
+    # Requested ids that do not exist or are not visible to the user
+    missing: List[str] = []
+
+
 class Email(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -320,3 +567,5 @@ class ReplyEmail(BaseModel):
 
 # Update forward references for Pydantic models
 Thread.model_rebuild()
+ThreadPage.model_rebuild()
+ThreadBatch.model_rebuild()
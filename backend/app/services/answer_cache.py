@@ -0,0 +1,97 @@
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.logger_config import get_logger
+from app.services import metrics
+from app.services.mail_cache import get_generation
+import json
+import numpy as np
+import time
+
+logger = get_logger(__name__)
+
+# Per-user semantic cache of chat answers. Entries live under the user's
+# mailbox generation, so any sync that changes their mail moves lookups to an
+# empty key; stale answers are never served and simply expire.
+
+_hits = 0
+_lookups = 0
+
+
+def _key(user_email: str, generation: int, scope: str) -> str:
+    return f"answercache:{user_email}:{generation}:{scope}"
+
+
+def _scope(thread_id: Optional[int]) -> str:
+    # Thread-scoped questions only match answers about the same thread
+    return format(thread_id, "x") if thread_id is not None else "all"
+
+
+def _record(hit: bool) -> None:
+    global _hits, _lookups
+    _lookups += 1
+    if hit:
+        _hits += 1
+    metrics.incr("answer_cache.hit" if hit else "answer_cache.miss")
+    metrics.set_gauge("answer_cache.hit_rate", round(_hits / _lookups, 4))
+
+
+async def lookup(redis, user_email: str, embedding: List[float], thread_id: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+    """Return (best cached answer within the similarity threshold or None, generation).
+    Like mail_cache.get_cached, the generation is read before answering and must
+    be passed to store(), so an answer built from pre-sync data is never filed
+    under the post-sync generation.
+    """
+    if redis is None or not settings.ANSWER_CACHE_ENABLED:
+        return None, None
+    started = time.perf_counter()
+    try:
+        generation = await get_generation(redis, user_email)
+        raw_entries = await redis.lrange(_key(user_email, generation, _scope(thread_id)), 0, -1)
+    except Exception as e:
+        logger.warning("Answer cache lookup failed: %s", e)
+        return None, None
+    best: Optional[Dict[str, Any]] = None
+    if raw_entries:
+        entries = [json.loads(raw) for raw in raw_entries]
+        matrix = np.asarray([e["embedding"] for e in entries], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        sims = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+        idx = int(np.argmax(sims))
+        if sims[idx] >= settings.ANSWER_CACHE_SIMILARITY:
+            best = entries[idx]
+            best["similarity"] = float(sims[idx])
+    metrics.observe("answer_cache.lookup_ms", (time.perf_counter() - started) * 1000)
+    _record(best is not None)
+    return best, generation
+
+
+async def store(
+    redis,
+    user_email: str,
+    generation: Optional[int],
+    embedding: List[float],
+    query: str,
+    answer: str,
+    sources: List[Dict[str, Any]],
+    thread_id: Optional[int] = None,
+) -> None:
+    """Remember an answer under the generation returned by lookup()."""
+    if redis is None or generation is None or not settings.ANSWER_CACHE_ENABLED or not answer:
+        return
+    try:
+        key = _key(user_email, generation, _scope(thread_id))
+        entry = json.dumps({
+            "query": query,
+            "answer": answer,
+            "sources": sources,
+            "embedding": [round(float(x), 6) for x in embedding],
+            "createdAt": time.time(),
+        })
+        pipe = redis.pipeline()
+        pipe.lpush(key, entry)
+        pipe.ltrim(key, 0, settings.ANSWER_CACHE_MAX_ENTRIES - 1)
+        pipe.expire(key, settings.ANSWER_CACHE_TTL_SECONDS)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning("Answer cache store failed: %s", e)
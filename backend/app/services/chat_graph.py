@@ -1,65 +1,291 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, TypedDict
 from langgraph.graph import StateGraph, END
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from app.core.config import settings
 from app.services.vector_store import get_vector_store
+from app.services.hybrid_retriever import hybrid_retrieve, resolve_sender
+from app.services.context_packer import pack_context
+from app.services.query_analyzer import analyze_query
+from app.services.structured_query import classify_intent, run_structured, fallback_phrase
+from app.core.db import AsyncSessionLocal
+import json
+from app.services import answer_cache, metrics
+from app.services.embedding_cache import embed_query
+from app.services.llm_gateway import get_llm_gateway
+from app.services.chat_memory import (
+    add_turn, history_messages, is_follow_up, refers_back, split_history, transcript,
+)
+from app.services.rag_metrics import note_active_user, maybe_sample_diag
 from app.logger_config import get_logger
 from app.core.config import settings
 import os
-import datetime
+import time
 
 logger = get_logger(__name__)
 
 os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
 
 
-def build_chat_graph() -> Any:
-    """Build a simple LangGraph for email RAG: retrieve -> generate."""
-    llm = init_chat_model(settings.OPENAI_MODEL, temperature=0)
-    store = get_vector_store()
-    retriever = store.as_retriever(search_kwargs={"k": 5})
+def sources_from_docs(docs: List[Any]) -> List[Dict[str, Any]]:
+    """Citation payload for retrieved chunks, shared by the chat endpoints."""
+    sources: List[Dict[str, Any]] = []
+    for d in docs:
+        md = d.metadata or {}
+        sources.append({
+            "email_id": md.get("email_id"),
+            "thread_id": md.get("thread_id"),
+            "subject": md.get("subject"),
+            "snippet": md.get("snippet"),
+            "sent_at": md.get("sent_at"),
+        })
+    return sources
 
-    def retrieve(state: Dict[str, Any]) -> Dict[str, Any]:
-        """Retrieve docs filtered by user_email from metadata."""
+
+class ChatState(TypedDict, total=False):
+    # Turn input
+    query: str
+    user_email: str
+    thread_id: Optional[int]
+    # Working fields for the current turn; reset by contextualize
+    question: str
+    reuse_docs: bool
+    query_embedding: Optional[List[float]]
+    cache_generation: Optional[int]
+    intent: Any
+    docs: List[Any]
+    retrieval: Optional[Dict[str, Any]]
+    answer: str
+    sources: List[Dict[str, Any]]
+    structured: bool
+    cached: bool
+    # Conversation memory, carried between turns by the checkpointer
+    history: List[Dict[str, str]]
+    summary: str
+    prior_docs: List[Any]
+
+
+_TURN_DEFAULTS: Dict[str, Any] = {
+    "reuse_docs": False, "query_embedding": None, "cache_generation": None,
+    "intent": None, "docs": [], "retrieval": None, "answer": "", "sources": [],
+    "structured": False, "cached": False,
+}
+
+
+def _deadline(config: RunnableConfig) -> Optional[float]:
+    # Absolute time.monotonic() deadline for the whole request, set by the route
+    return (config.get("configurable") or {}).get("deadline")
+
+
+def build_chat_graph(checkpointer: Any = None) -> Any:
+    """Build the email chat graph:
+    contextualize -> cache_lookup -> (route -> (structured | retrieve -> generate)
+    -> cache_store) -> remember.
+    With a checkpointer, history/summary/prior_docs persist per conversation.
+    """
+    # Concurrency caps, deadlines and model fallback live in the gateway
+    llm = get_llm_gateway()
+
+    async def contextualize(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        """Start a turn: clear per-turn fields and rewrite follow-ups as standalone questions."""
+        question: str = state["query"]
+        history = state.get("history") or []
+        update = {**_TURN_DEFAULTS, "question": question}
+        if not history or not is_follow_up(question):
+            return update
+        # "When is it due?" right after an answer is about the same emails
+        update["reuse_docs"] = refers_back(question) and bool(state.get("prior_docs"))
+        summary = state.get("summary")
+        conversation = (f"Summary: {summary}\n" if summary else "") + transcript(history)
+        messages = [
+            SystemMessage(content=(
+                "Rewrite the user's follow-up as a standalone question about their email, "
+                "resolving references from the conversation. Reply with the question only.")),
+            HumanMessage(content=f"Conversation:\n{conversation}\n\nFollow-up: {question}"),
+        ]
+        started = time.perf_counter()
+        try:
+            msg = await llm.ainvoke(messages, deadline=_deadline(config), purpose="condense")
+            update["query"] = (msg.content or "").strip() or question
+        except Exception as e:
+            logger.warning("Follow-up rewrite failed: %s", e)
+        finally:
+            metrics.observe("rag.condense_ms", (time.perf_counter() - started) * 1000)
+        logger.info("Follow-up rewritten reuse_docs=%s query='%s'",
+                    update["reuse_docs"], update.get("query", question)[:120])
+        return update
+
+    async def remember(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        """Record the turn; fold older messages into the summary to bound the prompt."""
+        update: Dict[str, Any] = {"docs": [], "intent": None, "query_embedding": None}
+        answer = state.get("answer") or ""
+        if not answer:
+            return update
+        history = add_turn(state.get("history") or [], state.get("question") or state["query"], answer)
+        older, update["history"] = split_history(history)
+        if older:
+            summary = state.get("summary") or ""
+            messages = [
+                SystemMessage(content=(
+                    "Maintain a running summary of a conversation about the user's email. "
+                    "Keep names, dates, subjects and decisions; stay under 150 words.")),
+                HumanMessage(content=f"Current summary:\n{summary or '(none)'}\n\n"
+                                     f"Messages to add:\n{transcript(older)}"),
+            ]
+            started = time.perf_counter()
+            try:
+                msg = await llm.ainvoke(messages, deadline=_deadline(config), purpose="summarize")
+                update["summary"] = (msg.content or "").strip() or summary
+            except Exception as e:
+                # The folded messages are dropped either way so the prompt stays bounded
+                logger.warning("History summary failed: %s", e)
+            finally:
+                metrics.observe("rag.summarize_ms", (time.perf_counter() - started) * 1000)
+        # Documents a follow-up can refer back to; structured/cached answers have none
+        if not state.get("reuse_docs"):
+            update["prior_docs"] = state.get("docs") or []
+        return update
+
+    async def cache_lookup(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        """Serve a cached answer for a near-identical question on an unchanged mailbox."""
+        if state.get("reuse_docs"):
+            # The answer depends on the conversation, not just the question
+            return state
+        redis = (config.get("configurable") or {}).get("redis")
+        user_email: str = state["user_email"]
+        try:
+            # Embedded once here (or served from the embedding cache) and reused
+            # by the vector leg on a miss
+            embedding = await embed_query(get_vector_store().embeddings, state["query"], redis)
+        except Exception as e:
+            logger.warning("Query embedding failed: %s", e)
+            return state
+        hit, generation = await answer_cache.lookup(
+            redis, user_email, embedding, state.get("thread_id"))
+        if hit is not None:
+            logger.info("Answer cache hit user=%s similarity=%.3f cached_query='%s'",
+                        user_email, hit["similarity"], hit["query"][:120])
+            return {**state, "answer": hit["answer"], "sources": hit["sources"], "cached": True}
+        return {**state, "query_embedding": embedding, "cache_generation": generation}
+
+    async def cache_store(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        """Remember the answer under the generation seen before answering."""
+        redis = (config.get("configurable") or {}).get("redis")
+        embedding = state.get("query_embedding")
+        if embedding is not None:
+            await answer_cache.store(
+                redis, state["user_email"], state.get("cache_generation"), embedding,
+                state["query"], state.get("answer", ""), state.get("sources", []),
+                state.get("thread_id"))
+        return {"query_embedding": None, "cache_generation": None}
+
+    def after_cache_lookup(state: Dict[str, Any]) -> str:
+        return "remember" if state.get("cached") else "route"
+
+    async def route(state: Dict[str, Any]) -> Dict[str, Any]:
+        """Send lookup-style questions to SQL; everything else to RAG."""
+        # Follow-ups about the previous documents stay on them
+        intent = None if state.get("reuse_docs") else classify_intent(state["query"])
+        metrics.incr("rag.route_structured" if intent else "rag.route_rag")
+        return {**state, "intent": intent}
+
+    async def structured(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        """Answer from parameterized SQL; the LLM only phrases the result."""
+        intent = state["intent"]
         user_email: str = state["user_email"]
         query: str = state["query"]
-        logger.info(
-            f"RAG retrieve start user={user_email} query='{query[:120]}'")
-        # With Chroma, apply metadata filter via vector store directly for reliability
-        # Try vector-store-native filter first; fallback to retriever with filter
+        intent.constraints.thread_id = state.get("thread_id")
+        started = time.perf_counter()
         try:
-            docs = store.similarity_search(
-                query, k=5, filter={"user_email": user_email}
-            )
+            if intent.constraints.sender:
+                await resolve_sender(user_email, intent.constraints)
+            async with AsyncSessionLocal() as session:
+                result = await run_structured(session, user_email, intent)
         except Exception as e:
-            logger.error("Error in similarity_search: %s", e)
-            retriever.search_kwargs["filter"] = {"user_email": user_email}
-            docs = retriever.get_relevant_documents(query)
-        # Extra diagnostics: count totals and per-user filter for troubleshooting
+            # Fall back to retrieval rather than failing the question
+            logger.error("Structured query failed, using RAG: %s", e)
+            metrics.incr("rag.structured_errors")
+            return {**state, "intent": None}
+        metrics.observe("rag.structured_sql_ms", (time.perf_counter() - started) * 1000)
+        facts = result["facts"]
+        logger.info("Structured answer kind=%s facts=%s", intent.kind, facts)
+        messages = [
+            SystemMessage(content=(
+                "You are an email assistant. Answer the question in one or two "
+                "sentences using only the query result given. Do not invent details.")),
+            HumanMessage(content=f"Question: {query}\n\nQuery result (JSON):\n{json.dumps(facts, default=str)}"),
+        ]
+        started = time.perf_counter()
         try:
-            total = store._collection.count()  # type: ignore[attr-defined]
-            # Chroma where filter for counting
-            where = {"user_email": user_email}
-            per_user = store._collection.count(
-                where=where)  # type: ignore[attr-defined]
-            logger.info(
-                "RAG retrieve diag: total=%s per_user=%s user=%s", total, per_user, user_email
-            )
-        except Exception:
-            pass
+            msg = await llm.ainvoke(messages, deadline=_deadline(config), purpose="phrase")
+            ans = (msg.content or "").strip()
+        except Exception as e:
+            logger.error("LLM phrasing failed: %s", e)
+            metrics.incr("rag.generate_errors")
+            ans = ""
+        finally:
+            metrics.observe("rag.phrase_ms", (time.perf_counter() - started) * 1000)
+        return {**state, "answer": ans or fallback_phrase(intent, facts),
+                "sources": result["sources"], "structured": True}
+
+    def after_route(state: Dict[str, Any]) -> str:
+        return "structured" if state.get("intent") else "retrieve"
+
+    def after_structured(state: Dict[str, Any]) -> str:
+        return "cache_store" if state.get("structured") else "retrieve"
+
+    async def retrieve(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        """Retrieve the user's docs with hybrid vector + full-text search."""
+        # Shared per-process store; lookup is a dict hit after first use
+        store = get_vector_store()
+        user_email: str = state["user_email"]
+        query: str = state["query"]
+        if state.get("reuse_docs"):
+            docs = state.get("prior_docs") or []
+            metrics.incr("rag.docs_reused")
+            logger.info("RAG retrieve: reusing %d docs from the previous turn", len(docs))
+            return {"docs": docs, "retrieval": {"reused": len(docs)}}
+        logger.info(
+            f"RAG retrieve start user={user_email} query='{query[:120]}'")
+        started = time.perf_counter()
+        # Vector and full-text legs run concurrently; exact names, order numbers
+        # and addresses that embeddings miss come back through the lexical leg
+        # Date/sender/thread constraints become metadata filters on both legs
+        constraints = analyze_query(query)
+        constraints.thread_id = state.get("thread_id")
+        if constraints.sender:
+            try:
+                await resolve_sender(user_email, constraints)
+            except Exception as e:
+                logger.warning("Sender resolution failed: %s", e)
+        candidates, retrieval = await hybrid_retrieve(
+            store, user_email, query, k=settings.HYBRID_CANDIDATES, constraints=constraints,
+            query_embedding=state.get("query_embedding"),
+            redis=(config.get("configurable") or {}).get("redis"))
+        # MMR + per-email merge + token budget; one packed doc per email
+        docs, pack = pack_context(candidates)
+        retrieval["context"] = pack.as_dict()
+        metrics.observe("rag.context_tokens", pack.tokens)
+        retrieve_ms = (time.perf_counter() - started) * 1000
+        metrics.observe("rag.retrieve_ms", retrieve_ms)
+        metrics.observe("rag.docs_returned", len(docs))
+        note_active_user(user_email)
+        maybe_sample_diag(user_email)
         logger.info(
-            "RAG retrieve done: %d docs | subjects=%s",
+            "RAG retrieve done: %d docs in %.0fms (vector %.0fms/%d, lexical %.0fms/%d) | subjects=%s",
             len(docs),
+            retrieve_ms,
+            retrieval["vector_ms"], retrieval["vector_hits"],
+            retrieval["lexical_ms"], retrieval["lexical_hits"],
             [(getattr(d, 'metadata', {}) or {}).get('subject') for d in docs]
         )
-        # IMPORTANT: carry forward original fields so downstream nodes can access them
-        return {"docs": docs, "query": query, "user_email": user_email}
+        return {"docs": docs, "retrieval": retrieval}
 
-    def generate(state: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
         docs = state.get("docs", [])
         query = state["query"]
-        context = "\n\n".join(d.page_content for d in docs)
+        # Docs arrive packed to the token budget with a header per email
+        context = "\n\n---\n\n".join(d.page_content for d in docs)
         logger.info(
             "RAG generate: context_chars=%d, num_docs=%d",
             len(context),
@@ -68,52 +294,46 @@ def build_chat_graph() -> Any:
         system = "You are an email assistant. Answer strictly using the provided context."
         messages = [
             SystemMessage(content=system),
+            # Bounded by remember(): a short summary plus the latest turns
+            *history_messages(state.get("summary"), state.get("history") or []),
             HumanMessage(content=f"Question: {query}\n\nContext:\n{context}"),
         ]
+        started = time.perf_counter()
         try:
-            msg = llm.invoke(messages)
+            msg = await llm.ainvoke(messages, deadline=_deadline(config), purpose="generate")
         except Exception as e:
             logger.error("LLM invoke failed: %s", e)
-            return {"answer": "", "sources": []}
+            metrics.incr("rag.generate_errors")
+            return {**state, "answer": "", "sources": []}
+        finally:
+            metrics.observe("rag.generate_ms",
+                            (time.perf_counter() - started) * 1000)
         ans = (msg.content or "").strip()
         logger.info("RAG generate: answer_chars=%d empty=%s",
                     len(ans), not bool(ans))
-        sources: List[Dict[str, Any]] = []
-        for d in docs:
-            md = d.metadata or {}
-            sources.append({
-                "email_id": md.get("email_id"),
-                "thread_id": md.get("thread_id"),
-                "subject": md.get("subject"),
-                "snippet": md.get("snippet"),
-                "sent_at": md.get("sent_at"),
-            })
-        return {"answer": ans, "sources": sources}
-
-    g = StateGraph(dict)
+        return {**state, "answer": ans, "sources": sources_from_docs(docs)}
+
+    g = StateGraph(ChatState)
+    g.add_node("contextualize", contextualize)
+    g.add_node("cache_lookup", cache_lookup)
+    g.add_node("route", route)
+    g.add_node("structured", structured)
     g.add_node("retrieve", retrieve)
     g.add_node("generate", generate)
-    g.set_entry_point("retrieve")
+    g.add_node("cache_store", cache_store)
+    g.add_node("remember", remember)
+    g.set_entry_point("contextualize")
+    g.add_edge("contextualize", "cache_lookup")
+    g.add_conditional_edges("cache_lookup", after_cache_lookup, ["route", "remember"])
+    g.add_conditional_edges("route", after_route, ["structured", "retrieve"])
+    g.add_conditional_edges("structured", after_structured, ["retrieve", "cache_store"])
     g.add_edge("retrieve", "generate")
-    g.add_edge("generate", END)
-    return g.compile()
+    g.add_edge("generate", "cache_store")
+    g.add_edge("cache_store", "remember")
+    g.add_edge("remember", END)
+    return g.compile(checkpointer=checkpointer)
 
 
-# Singleton compiled app
+# Singleton compiled app without memory; the API builds one with a checkpointer
 chat_app = build_chat_graph()
 
-
-def llm_test(prompt: str = "Respond with the word 'pong'.") -> str:
-    """Simple non-RAG LLM call to verify API key/model wiring."""
-    try:
-        llm = init_chat_model(settings.OPENAI_MODEL, temperature=0)
-        now = datetime.datetime.utcnow().isoformat()
-        messages = [
-            SystemMessage(content="You are a helpful assistant."),
-            HumanMessage(content=f"{prompt} UTC={now}"),
-        ]
-        msg = llm.invoke(messages)
-        return (msg.content or "").strip()
-    except Exception as e:
-        logger.error("LLM test failed: %s", e)
-        return ""
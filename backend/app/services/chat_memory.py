@@ -0,0 +1,181 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.db_url import libpq_database_url
+from app.services.context_packer import count_tokens
+import re
+
+# Multi-turn chat memory. Graph state is checkpointed per conversation in
+# Postgres; between turns it carries the recent messages verbatim, a running
+# summary of older ones, and the documents packed for the last RAG answer so a
+# follow-up about "that email" can be answered without retrieving again.
+
+# Follow-ups that point back at what was just discussed
+_REFERS_BACK_RE = re.compile(
+    r"\b(?:it|its|them|they|their)\b"
+    r"|\b(?:that|this|those|these)\s+(?:one|ones|emails?|messages?|threads?|conversations?)\b"
+    r"|\b(?:that|this|those|these)\s*[?.!]?\s*$"
+    r"|\bthe\s+(?:first|second|third|last|same|other|above)\s+(?:one|emails?|messages?|threads?)\b"
+    r"|\b(?:above|previous)\b", re.I)
+# Elliptical follow-ups that only make sense next to the previous question:
+# "and from Bob?", "same for last week", "why?", "from Alice too?"
+_CONTINUATION_RE = re.compile(
+    r"^\s*(?:and|or|also|what\s+about|how\s+about|same\s+for|anything\s+else|what\s+else|more)\b"
+    r"|^\s*(?:why|when|who|where|how|which\s+one)\s*[?.!]*\s*$"
+    r"|\b(?:too|as\s+well|instead)\s*[?.!]*\s*$", re.I)
+
+# Long answers are clipped before they are stored in the history
+_MAX_MESSAGE_CHARS = 4000
+
+
+def conversation_key(user_email: str, conversation_id: str) -> str:
+    """Checkpointer thread id; namespaced by user so ids can't cross accounts."""
+    return f"{user_email}:{conversation_id}"
+
+
+def refers_back(query: str) -> bool:
+    return bool(_REFERS_BACK_RE.search(query))
+
+
+def is_follow_up(query: str) -> bool:
+    """Whether the question needs the conversation to be understood.
+    Only explicit references or ellipsis count; a short question on its own
+    ("anything from HR?") is standalone.
+    """
+    return refers_back(query) or bool(_CONTINUATION_RE.search(query))
+
+
+def add_turn(history: List[Dict[str, str]], question: str, answer: str) -> List[Dict[str, str]]:
+    return [*history,
+            {"role": "user", "content": question[:_MAX_MESSAGE_CHARS]},
+            {"role": "assistant", "content": answer[:_MAX_MESSAGE_CHARS]}]
+
+
+def split_history(history: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Split into (older messages to fold into the summary, recent messages to keep).
+    Keeps the newest messages within CHAT_HISTORY_MAX_MESSAGES and
+    CHAT_HISTORY_MAX_TOKENS, but always the latest exchange.
+    """
+    keep = 0
+    tokens = 0
+    for message in reversed(history):
+        tokens += count_tokens(message["content"])
+        if keep >= 2 and (keep >= settings.CHAT_HISTORY_MAX_MESSAGES
+                          or tokens > settings.CHAT_HISTORY_MAX_TOKENS):
+            break
+        keep += 1
+    cut = len(history) - keep
+    return history[:cut], history[cut:]
+
+
+def transcript(history: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in history)
+
+
+def history_messages(summary: Optional[str], history: List[Dict[str, str]]) -> List[BaseMessage]:
+    """Prompt messages for the conversation so far (summary first, then recent turns)."""
+    messages: List[BaseMessage] = []
+    if summary:
+        messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    for m in history:
+        cls = HumanMessage if m["role"] == "user" else AIMessage
+        messages.append(cls(content=m["content"]))
+    return messages
+
+
+class ChatMemory:
+    """Postgres-backed LangGraph checkpointer with its own psycopg pool."""
+
+    def __init__(self) -> None:
+        self.pool: Optional[AsyncConnectionPool] = None
+        self.saver: Optional[AsyncPostgresSaver] = None
+
+    async def start(self) -> None:
+        # Same database as the app; the saver speaks psycopg 3 (libpq), not asyncpg
+        conninfo = libpq_database_url(settings.DATABASE_URL)
+        self.pool = AsyncConnectionPool(
+            conninfo,
+            min_size=1,
+            max_size=settings.CHAT_MEMORY_POOL_SIZE,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=False,
+        )
+        await self.pool.open()
+        self.saver = AsyncPostgresSaver(self.pool)
+        # Creates/migrates the checkpoint tables (idempotent)
+        await self.saver.setup()
+
+    async def stop(self) -> None:
+        if self.pool is not None:
+            try:
+                await self.pool.close()
+            except Exception:
+                pass
+        self.pool = None
+        self.saver = None
+
+    async def delete_conversation(self, user_email: str, conversation_id: str) -> None:
+        if self.saver is not None:
+            await self.saver.adelete_thread(conversation_key(user_email, conversation_id))
+
+
+# Checkpoint rows have no timestamp column; the checkpoint JSON carries "ts"
+_CONVERSATION_ACTIVITY = """
+    SELECT thread_id, max((checkpoint->>'ts')::timestamptz) AS last_active
+    FROM checkpoints
+    GROUP BY thread_id
+    HAVING max((checkpoint->>'ts')::timestamptz) < :settled
+"""
+
+
+async def prune_conversations(session: AsyncSession, idle_before: datetime, settled_before: datetime) -> Tuple[int, int]:
+    """Retention for the checkpointer tables (written by the API, pruned by the worker).
+    Conversations idle since idle_before are deleted outright. The others
+    quiet since settled_before keep only their latest checkpoint and the
+    channel blobs it references; active ones are left alone so a turn being
+    written is never cut in half. Returns (conversations deleted, conversations compacted).
+    """
+    exists = (await session.execute(text("SELECT to_regclass('checkpoints')"))).scalar()
+    if exists is None:
+        return 0, 0
+    rows = (await session.execute(text(_CONVERSATION_ACTIVITY), {"settled": settled_before})).all()
+    idle = [r.thread_id for r in rows if r.last_active < idle_before]
+    settled = [r.thread_id for r in rows if r.last_active >= idle_before]
+    if idle:
+        for table in ("checkpoint_writes", "checkpoint_blobs", "checkpoints"):
+            await session.execute(text(f"DELETE FROM {table} WHERE thread_id = ANY(:ids)"), {"ids": idle})
+    if settled:
+        params = {"ids": settled}
+        # checkpoint_id is a time-ordered uuid6, so the max is the latest
+        await session.execute(text("""
+            DELETE FROM checkpoints c
+            USING (
+                SELECT thread_id, checkpoint_ns, max(checkpoint_id) AS latest
+                FROM checkpoints WHERE thread_id = ANY(:ids)
+                GROUP BY thread_id, checkpoint_ns
+            ) l
+            WHERE c.thread_id = l.thread_id AND c.checkpoint_ns = l.checkpoint_ns
+              AND c.checkpoint_id < l.latest
+        """), params)
+        await session.execute(text("""
+            DELETE FROM checkpoint_writes w
+            WHERE w.thread_id = ANY(:ids) AND NOT EXISTS (
+                SELECT 1 FROM checkpoints c
+                WHERE c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns
+                  AND c.checkpoint_id = w.checkpoint_id)
+        """), params)
+        await session.execute(text("""
+            DELETE FROM checkpoint_blobs b
+            WHERE b.thread_id = ANY(:ids) AND NOT EXISTS (
+                SELECT 1 FROM checkpoints c
+                WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+                  AND c.checkpoint->'channel_versions'->>b.channel = b.version)
+        """), params)
+    await session.commit()
+    return len(idle), len(settled)
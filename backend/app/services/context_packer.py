@@ -0,0 +1,171 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.services.hybrid_retriever import Candidate
+from app.services.query_analyzer import canonical_hex
+import numpy as np
+import tiktoken
+
+# Turns fused retrieval candidates into the prompt context:
+#   1. MMR over chunk embeddings drops near-duplicates (quoted replies,
+#      newsletter boilerplate) while keeping relevance order
+#   2. chunks of the same email are merged, removing splitter overlap
+#   3. blocks are packed best-first into a tiktoken budget
+
+_encoding: Optional[tiktoken.Encoding] = None
+
+
+def _get_encoding() -> tiktoken.Encoding:
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    return len(_get_encoding().encode(text, disallowed_special=()))
+
+
+@dataclass
+class PackStats:
+    candidates: int
+    selected: int
+    emails: int
+    tokens: int
+    truncated: bool
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "candidates": self.candidates,
+            "selected": self.selected,
+            "emails": self.emails,
+            "tokens": self.tokens,
+            "truncated": self.truncated,
+        }
+
+
+def _email_key(doc: Document) -> str:
+    email_id = (doc.metadata or {}).get("email_id")
+    return canonical_hex(email_id) if email_id else str(id(doc))
+
+
+def mmr_select(candidates: List[Candidate], max_items: int, lambda_mult: float) -> List[Candidate]:
+    """Maximal marginal relevance: relevance from the fused score, redundancy
+    from cosine similarity between chunk embeddings. Snippets without an
+    embedding only count as redundant with chunks of the same email.
+    """
+    n = len(candidates)
+    if n <= 1:
+        return list(candidates[:max_items])
+    relevance = np.array([c.score for c in candidates], dtype=np.float64)
+    span = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / span if span > 0 else np.ones(n)
+
+    has_vec = np.array([c.embedding is not None for c in candidates])
+    dim = next((len(c.embedding) for c in candidates if c.embedding is not None), 0)
+    vectors = np.zeros((n, max(dim, 1)), dtype=np.float64)
+    for i, c in enumerate(candidates):
+        if c.embedding is not None:
+            vectors[i] = c.embedding
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    similarity = vectors @ vectors.T
+    similarity[~has_vec, :] = 0.0
+    similarity[:, ~has_vec] = 0.0
+    keys = np.array([_email_key(c.doc) for c in candidates])
+    same_email = keys[:, None] == keys[None, :]
+    # Snippets repeat their email's content, so treat them as fully redundant with it
+    snippet_pair = same_email & ~(has_vec[:, None] & has_vec[None, :])
+    similarity[snippet_pair] = 1.0
+
+    selected: List[int] = [0]
+    max_sim = similarity[0].copy()
+    remaining = np.ones(n, dtype=bool)
+    remaining[0] = False
+    while len(selected) < max_items and remaining.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        # Near-identical to something already chosen: nothing new to add
+        if max_sim[best] >= settings.CONTEXT_DUPLICATE_SIMILARITY:
+            remaining[best] = False
+            continue
+        selected.append(best)
+        remaining[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+    return [candidates[i] for i in selected]
+
+
+def _merge_chunks(docs: List[Document]) -> str:
+    """Join chunks of one email in document order, dropping the overlap between
+    neighbours (start_index metadata); gaps are marked with an ellipsis."""
+    ordered = sorted(docs, key=lambda d: (d.metadata or {}).get("start_index", 0))
+    text = ""
+    end = None
+    for doc in ordered:
+        content = doc.page_content
+        start = (doc.metadata or {}).get("start_index")
+        if end is not None and start is not None and start <= end:
+            content = content[end - start:]
+        elif text and content in text:
+            continue
+        elif text:
+            text += "\n...\n"
+        text += content
+        if start is not None:
+            end = max(end or 0, start + len(doc.page_content))
+    return text
+
+
+def _header(meta: Dict[str, Any]) -> str:
+    sender = meta.get("from_name") or meta.get("from_address") or ""
+    parts = [f"Subject: {meta.get('subject') or ''}"]
+    if sender:
+        parts.append(f"From: {sender}")
+    if meta.get("sent_at"):
+        parts.append(f"Date: {meta['sent_at']}")
+    return " | ".join(parts)
+
+
+def pack_context(candidates: List[Candidate], max_tokens: Optional[int] = None) -> tuple[List[Document], PackStats]:
+    """Select, merge and budget candidates into one Document per email, best first."""
+    budget = max_tokens or settings.CONTEXT_MAX_TOKENS
+    encoding = _get_encoding()
+    chosen = mmr_select(candidates, settings.CONTEXT_MAX_CHUNKS, settings.CONTEXT_MMR_LAMBDA)
+
+    # Group by email, keeping the rank of each email's best chunk
+    groups: Dict[str, List[Document]] = {}
+    for c in chosen:
+        groups.setdefault(_email_key(c.doc), []).append(c.doc)
+
+    packed: List[Document] = []
+    used = 0
+    truncated = False
+    for docs in groups.values():
+        meta = dict(docs[0].metadata or {})
+        block = f"{_header(meta)}\n{_merge_chunks(docs)}"
+        tokens = encoding.encode(block, disallowed_special=())
+        remaining = budget - used
+        if len(tokens) > remaining:
+            truncated = True
+            # A partial block is only worth it if a useful amount fits
+            if remaining < settings.CONTEXT_MIN_BLOCK_TOKENS:
+                break
+            tokens = tokens[:remaining]
+            block = encoding.decode(tokens)
+        used += len(tokens)
+        meta.pop("start_index", None)
+        packed.append(Document(page_content=block, metadata=meta))
+        if used >= budget:
+            break
+    return packed, PackStats(
+        candidates=len(candidates),
+        selected=len(chosen),
+        emails=len(packed),
+        tokens=used,
+        truncated=truncated,
+    )
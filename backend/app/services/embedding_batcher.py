@@ -0,0 +1,232 @@
+from dataclasses import dataclass, field
+from typing import Any, List
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.logger_config import get_logger
+import asyncio
+import time
+import uuid
+import openai
+import tiktoken
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class EmbeddingStats:
+    """Throughput counters for one indexing run."""
+    chunks: int = 0
+    tokens: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    failed_email_ids: set[str] = field(default_factory=set)
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return max(end - self.started_at, 1e-9)
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.tokens / self.elapsed
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.elapsed
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failedBatches": self.failed_batches,
+            "failedEmailIds": sorted(self.failed_email_ids),
+            "elapsedSeconds": round(self.elapsed, 3),
+            "tokensPerSec": round(self.tokens_per_sec, 1),
+            "chunksPerSec": round(self.chunks_per_sec, 2),
+        }
+
+
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def pack_batches(
+    docs: List[Document],
+    max_tokens: int,
+    max_items: int,
+    encoding: tiktoken.Encoding,
+) -> List[tuple[List[Document], int]]:
+    """Greedily pack documents into batches bounded by token and item counts.
+    A single document larger than the budget is sent on its own.
+    Returns a list of (documents, token_count) pairs.
+    """
+    batches: List[tuple[List[Document], int]] = []
+    current: List[Document] = []
+    current_tokens = 0
+    for doc in docs:
+        n = len(encoding.encode(doc.page_content, disallowed_special=()))
+        if current and (current_tokens + n > max_tokens or len(current) >= max_items):
+            batches.append((current, current_tokens))
+            current, current_tokens = [], 0
+        current.append(doc)
+        current_tokens += n
+    if current:
+        batches.append((current, current_tokens))
+    return batches
+
+
+def chunk_id(doc: Document) -> str:
+    """Stable Chroma id for a chunk, so indexing the same email again overwrites it."""
+    meta = doc.metadata or {}
+    key = f"{meta.get('user_email')}:{meta.get('email_id')}:{meta.get('start_index', 0)}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def _retry_after_seconds(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return None
+
+
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class EmbeddingBatcher:
+    """Embed and index documents into Chroma in token-bounded batches.
+
+    Batches are packed up to EMBEDDING_BATCH_MAX_TOKENS using tiktoken and
+    run with at most EMBEDDING_CONCURRENCY requests in flight. A rate limit
+    on any batch pauses every batch until the provider's retry-after elapses.
+    """
+
+    def __init__(
+        self,
+        store: Chroma,
+        max_tokens: int | None = None,
+        max_items: int | None = None,
+        concurrency: int | None = None,
+    ):
+        self.store = store
+        self.max_tokens = max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+        self.max_items = max_items or settings.EMBEDDING_BATCH_MAX_ITEMS
+        self.concurrency = concurrency or settings.EMBEDDING_CONCURRENCY
+        self.encoding = _get_encoding(settings.EMBEDDING_MODEL)
+        self._resume_at = 0.0
+
+    async def _wait_for_limiter(self) -> None:
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _embed_batch(self, docs: List[Document], stats: EmbeddingStats) -> List[List[float]]:
+        attempts = settings.HTTP_RETRY_ATTEMPTS
+        base = settings.HTTP_RETRY_BACKOFF_BASE
+        cap = settings.HTTP_RETRY_BACKOFF_CAP
+        jitter = settings.HTTP_RETRY_JITTER
+        texts = [d.page_content for d in docs]
+        for attempt in range(attempts):
+            await self._wait_for_limiter()
+            try:
+                return await self.store.embeddings.aembed_documents(texts)
+            except _RETRYABLE_ERRORS as e:
+                if attempt == attempts - 1:
+                    raise
+                stats.retries += 1
+                sleep_s = min(cap, base * (2 ** attempt)) + jitter
+                if isinstance(e, openai.RateLimitError):
+                    hinted = _retry_after_seconds(e)
+                    if hinted is not None:
+                        sleep_s = max(sleep_s, hinted)
+                    # Pause all in-flight batches, not just this one
+                    self._resume_at = max(
+                        self._resume_at, time.monotonic() + sleep_s)
+                logger.warning(
+                    "Embedding batch retry %d/%d after %.2fs: %s",
+                    attempt + 1, attempts, sleep_s, e)
+                await asyncio.sleep(sleep_s)
+        return []
+
+    def _upsert(self, docs: List[Document], vectors: List[List[float]]) -> None:
+        # The vectors are already computed here; the public add_documents()
+        # would embed every chunk a second time, so write to the collection
+        self.store._collection.upsert(  # type: ignore[attr-defined]
+            ids=[chunk_id(d) for d in docs],
+            embeddings=vectors,
+            documents=[d.page_content for d in docs],
+            metadatas=[d.metadata or None for d in docs],
+        )
+
+    async def _index_batch(
+        self,
+        sem: asyncio.Semaphore,
+        docs: List[Document],
+        tokens: int,
+        stats: EmbeddingStats,
+    ) -> None:
+        async with sem:
+            try:
+                vectors = await self._embed_batch(docs, stats)
+                await asyncio.to_thread(self._upsert, docs, vectors)
+            except Exception as e:
+                stats.failed_batches += 1
+                stats.failed_email_ids.update(
+                    str(d.metadata.get("email_id")) for d in docs if d.metadata)
+                logger.error(
+                    "Embedding batch of %d chunks failed: %s", len(docs), e)
+                return
+            stats.chunks += len(docs)
+            stats.tokens += tokens
+            stats.batches += 1
+
+    async def index_documents(self, docs: List[Document]) -> EmbeddingStats:
+        """Embed and persist docs; returns throughput stats for the run.
+        Failed batches don't raise; check stats.failed_batches.
+        """
+        stats = EmbeddingStats()
+        if not docs:
+            stats.finished_at = time.perf_counter()
+            return stats
+        batches = pack_batches(docs, self.max_tokens,
+                               self.max_items, self.encoding)
+        sem = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(
+            self._index_batch(sem, batch, tokens, stats)
+            for batch, tokens in batches
+        ))
+        stats.finished_at = time.perf_counter()
+        logger.info(
+            "Embedding run: chunks=%d tokens=%d batches=%d/%d retries=%d "
+            "elapsed=%.2fs tokens/sec=%.1f chunks/sec=%.2f",
+            stats.chunks, stats.tokens, stats.batches, len(batches),
+            stats.retries, stats.elapsed, stats.tokens_per_sec,
+            stats.chunks_per_sec,
+        )
+        return stats
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.logger_config import get_logger
+from app.services import metrics
+import asyncio
+import hashlib
+import numpy as np
+import time
+
+logger = get_logger(__name__)
+
+# Query embeddings keyed by (model, normalized text). A per-process LRU answers
+# repeats without any I/O; Redis shares vectors across API processes and
+# restarts. Vectors are stored as raw float32 bytes (1536 dims -> 6 KB).
+
+_lru: "OrderedDict[str, List[float]]" = OrderedDict()
+# Concurrent misses for the same text share one embedding request
+_inflight: Dict[str, "asyncio.Task[List[float]]"] = {}
+
+
+def normalize(text: str) -> str:
+    """Cache key form of a query: whitespace collapsed, case folded."""
+    return " ".join(text.split()).casefold()
+
+
+def _key(model: str, text: str) -> str:
+    digest = hashlib.sha1(normalize(text).encode()).hexdigest()
+    return f"embcache:{model}:{digest}"
+
+
+def _remember(key: str, vector: List[float]) -> None:
+    _lru[key] = vector
+    _lru.move_to_end(key)
+    while len(_lru) > settings.EMBEDDING_CACHE_SIZE:
+        _lru.popitem(last=False)
+
+
+async def _from_redis(redis, key: str) -> Optional[List[float]]:
+    try:
+        raw = await redis.get(key)
+    except Exception as e:
+        logger.warning("Embedding cache read failed: %s", e)
+        return None
+    if not raw:
+        return None
+    return np.frombuffer(raw, dtype=np.float32).tolist()
+
+
+async def _to_redis(redis, key: str, vector: List[float]) -> None:
+    try:
+        await redis.set(key, np.asarray(vector, dtype=np.float32).tobytes(),
+                        ex=settings.EMBEDDING_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning("Embedding cache write failed: %s", e)
+
+
+async def _fetch(embeddings, key: str, text: str, redis) -> List[float]:
+    try:
+        vector = await _from_redis(redis, key) if redis is not None else None
+        if vector is not None:
+            metrics.incr("embedding_cache.hit_redis")
+        else:
+            metrics.incr("embedding_cache.miss")
+            started = time.perf_counter()
+            vector = await embeddings.aembed_query(" ".join(text.split()))
+            metrics.observe("embedding_cache.embed_ms", (time.perf_counter() - started) * 1000)
+            if redis is not None:
+                await _to_redis(redis, key, vector)
+        _remember(key, vector)
+        return vector
+    finally:
+        _inflight.pop(key, None)
+
+
+async def embed_query(embeddings, text: str, redis=None) -> List[float]:
+    """Embedding for a chat query: process LRU, then Redis, then the model."""
+    model = getattr(embeddings, "model", None) or settings.EMBEDDING_MODEL
+    key = _key(model, text)
+    vector = _lru.get(key)
+    if vector is not None:
+        _lru.move_to_end(key)
+        metrics.incr("embedding_cache.hit_local")
+        return vector
+    task = _inflight.get(key)
+    if task is not None:
+        metrics.incr("embedding_cache.hit_inflight")
+    else:
+        # Detached so a caller that is cancelled (client disconnect) doesn't
+        # take the shared request down with it for everyone else waiting
+        task = asyncio.create_task(_fetch(embeddings, key, text, redis))
+        _inflight[key] = task
+        # Nobody may be left to await a failure; retrieve it so it isn't logged
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return await asyncio.shield(task)
@@ -0,0 +1,194 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.core.db import AsyncSessionLocal
+from app.crud import search_emails, search_contacts
+from app.logger_config import get_logger
+from app.services import metrics
+from app.services.blocking import run_blocking
+from app.services.embedding_cache import embed_query
+from app.services.query_analyzer import QueryConstraints, build_where, canonical_hex
+import asyncio
+import html
+import re
+import time
+
+logger = get_logger(__name__)
+
+# Standard RRF damping constant; larger values flatten the rank contribution
+_RRF_K = 60
+_MARK_RE = re.compile(r"</?mark>")
+
+
+@dataclass
+class Candidate:
+    """A retrieved chunk (or lexical snippet) with its fused score."""
+    doc: Document
+    score: float
+    # Chroma embedding for vector chunks; None for lexical-only snippets
+    embedding: Optional[List[float]] = None
+
+
+async def _timed(name: str, coro, default: Any) -> Tuple[Any, float]:
+    """Run one retrieval leg; a failing leg yields `default` instead of failing the query."""
+    started = time.perf_counter()
+    try:
+        result = await coro
+    except Exception as e:
+        logger.error("Hybrid %s leg failed: %s", name, e)
+        metrics.incr(f"rag.{name}_errors")
+        result = default
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.observe(f"rag.{name}_ms", elapsed_ms)
+    return result, elapsed_ms
+
+
+async def resolve_sender(user_email: str, constraints: QueryConstraints) -> None:
+    """Turn the sender mention into concrete addresses from the user's contacts."""
+    sender = constraints.sender
+    if not sender:
+        return
+    if sender.lower() == "me":
+        constraints.from_addresses = [user_email]
+    elif "@" in sender:
+        constraints.from_addresses = [sender]
+    else:
+        async with AsyncSessionLocal() as session:
+            contacts = await search_contacts(session, user_email, sender, limit=5)
+        constraints.from_addresses = [c.address for c in contacts]
+
+
+async def _vector_leg(
+    store,
+    user_email: str,
+    query: str,
+    k: int,
+    constraints: QueryConstraints | None,
+    query_embedding: Optional[List[float]] = None,
+    redis=None,
+) -> List[Tuple[Document, List[float]]]:
+    where = build_where(user_email, constraints)
+    embedding = query_embedding or await embed_query(store.embeddings, query, redis)
+    # Query the collection directly so chunk embeddings come back for MMR
+    collection = store._collection  # type: ignore[attr-defined]
+    res = await run_blocking(
+        collection.query,
+        query_embeddings=[embedding],
+        n_results=k,
+        where=where,
+        include=["documents", "metadatas", "embeddings"],
+    )
+    ids = (res.get("ids") or [[]])[0]
+    texts = (res.get("documents") or [[]])[0]
+    metas = (res.get("metadatas") or [[]])[0]
+    embeddings = res.get("embeddings")
+    vectors = embeddings[0] if embeddings is not None and len(embeddings) else [None] * len(ids)
+    return [
+        (Document(id=chunk_id, page_content=text or "", metadata=meta or {}), vector)
+        for chunk_id, text, meta, vector in zip(ids, texts, metas, vectors)
+    ]
+
+
+async def _lexical_leg(user_email: str, query: str, k: int, constraints: QueryConstraints | None) -> List[Document]:
+    filters: Dict[str, Any] = {}
+    if constraints is not None and constraints.has_filters:
+        if constraints.has_metadata_filters:
+            # Date/sender phrases are handled by filters, not as search terms
+            query = constraints.residual
+        filters = {
+            "sent_after": constraints.sent_after,
+            "sent_before": constraints.sent_before,
+            "from_addresses": constraints.from_addresses or None,
+            "thread_id": constraints.thread_id,
+        }
+    async with AsyncSessionLocal() as session:
+        # Questions are natural language, so any term may match; rank sorts it out
+        hits = await search_emails(session, user_email, query, limit=k,
+                                   match_any=True, **filters)
+    docs: List[Document] = []
+    for hit in hits:
+        snippet = html.unescape(_MARK_RE.sub("", hit.snippet))
+        docs.append(Document(
+            page_content=f"{hit.subject}\n{snippet}".strip(),
+            metadata={
+                "user_email": user_email,
+                "email_id": format(hit.emailId, "x"),
+                "thread_id": format(hit.threadId, "x"),
+                "subject": hit.subject,
+                "snippet": snippet,
+                "sent_at": hit.sentAt.isoformat(),
+                "from_address": hit.fromAddress or "",
+                "from_name": hit.fromName or "",
+            },
+        ))
+    return docs
+
+
+def reciprocal_rank_fusion(
+    vector_hits: List[Tuple[Document, List[float]]],
+    lexical_docs: List[Document],
+) -> List[Candidate]:
+    """Fuse the legs with RRF, best first.
+    Vector chunks score by their own rank; a lexical hit on an email adds its
+    rank contribution to every chunk of that email. Emails found only
+    lexically enter as snippet candidates.
+    """
+    lexical_rank: Dict[str, int] = {}
+    for rank, doc in enumerate(lexical_docs):
+        lexical_rank.setdefault(canonical_hex(doc.metadata.get("email_id")), rank)
+
+    candidates: List[Candidate] = []
+    vector_emails: set[str] = set()
+    for rank, (doc, vector) in enumerate(vector_hits):
+        # Chunks indexed before ids were canonicalized carry the raw provider id
+        email_id = canonical_hex(doc.metadata.get("email_id"))
+        vector_emails.add(email_id)
+        score = 1.0 / (_RRF_K + rank + 1)
+        if email_id in lexical_rank:
+            score += 1.0 / (_RRF_K + lexical_rank[email_id] + 1)
+        candidates.append(Candidate(doc, score, vector))
+    for email_id, rank in lexical_rank.items():
+        if email_id not in vector_emails:
+            candidates.append(Candidate(lexical_docs[rank], 1.0 / (_RRF_K + rank + 1)))
+    candidates.sort(key=lambda c: c.score, reverse=True)
+    return candidates
+
+
+async def hybrid_retrieve(
+    store,
+    user_email: str,
+    query: str,
+    k: int,
+    constraints: QueryConstraints | None = None,
+    query_embedding: Optional[List[float]] = None,
+    redis=None,
+) -> Tuple[List[Candidate], Dict[str, Any]]:
+    """Vector and full-text legs in parallel (k candidates each), fused with RRF.
+    Constraints narrow both legs (Chroma where clause / SQL filters); if the
+    date/sender filters leave nothing, retrieval is retried without them but
+    still within the request's thread scope. Returns the fused
+    candidates plus per-leg timings and hit counts. A query embedding computed
+    earlier in the request (answer cache lookup) is reused when given;
+    otherwise it comes from the shared embedding cache (redis).
+    """
+    (vector_hits, vector_ms), (lexical_docs, lexical_ms) = await asyncio.gather(
+        _timed("vector", _vector_leg(store, user_email, query, k, constraints, query_embedding, redis), []),
+        _timed("lexical", _lexical_leg(user_email, query, k, constraints), []),
+    )
+    fused = reciprocal_rank_fusion(vector_hits, lexical_docs)
+    stats: Dict[str, Any] = {
+        "vector_ms": round(vector_ms, 1),
+        "lexical_ms": round(lexical_ms, 1),
+        "vector_hits": len(vector_hits),
+        "lexical_hits": len(lexical_docs),
+    }
+    if constraints is not None and constraints.has_filters:
+        stats["filters"] = constraints.as_dict()
+        if not fused and constraints.has_metadata_filters:
+            # Filters can exclude chunks indexed before the metadata existed
+            metrics.incr("rag.filters_relaxed")
+            fused, relaxed = await hybrid_retrieve(store, user_email, query, k,
+                                                   constraints=constraints.scope_only(),
+                                                   query_embedding=query_embedding, redis=redis)
+            stats["relaxed"] = relaxed
+    return fused, stats
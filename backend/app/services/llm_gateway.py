@@ -0,0 +1,226 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from langchain.chat_models import init_chat_model
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from app.core.config import settings
+from app.logger_config import get_logger
+from app.services import metrics
+import asyncio
+import threading
+import time
+
+logger = get_logger(__name__)
+
+# Every chat-model call in the API goes through one gateway per process:
+#   - a semaphore caps calls in flight; callers that can't get a slot before
+#     their deadline fail fast instead of piling up behind a slow provider
+#   - deadlines are absolute (time.monotonic()) and set once per request, so
+#     later steps only get the time that is left
+#   - the primary model streams; if it hasn't produced a first token within
+#     LLM_FALLBACK_AFTER_SECONDS the call moves to LLM_FALLBACK_MODEL
+#   - health is derived from recent traffic, with a cached probe otherwise
+
+
+class LLMUnavailable(Exception):
+    """No answer within the deadline (queue full, timeout or provider errors)."""
+
+
+class LLMDeadlineExceeded(LLMUnavailable):
+    """The request's deadline ran out; not a sign the gateway is saturated."""
+
+
+class _NoFirstToken(Exception):
+    """The model failed or stayed silent before its first token; safe to retry elsewhere."""
+
+
+def deadline_in(seconds: float) -> float:
+    return time.monotonic() + seconds
+
+
+def _remaining(deadline: Optional[float]) -> float:
+    if deadline is None:
+        return settings.LLM_TIMEOUT_SECONDS
+    return min(deadline - time.monotonic(), settings.LLM_TIMEOUT_SECONDS)
+
+
+@dataclass
+class HealthStatus:
+    ok: bool
+    model: str
+    checked_at: float
+    source: str  # "traffic" | "probe"
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ok": self.ok,
+            "model": self.model,
+            "source": self.source,
+            "latency_ms": round(self.latency_ms) if self.latency_ms is not None else None,
+            "age_s": round(time.monotonic() - self.checked_at, 1),
+            "error": self.error,
+        }
+
+
+class LLMGateway:
+    def __init__(self) -> None:
+        # stream_usage makes OpenAI report token counts on streamed responses
+        self.primary = init_chat_model(settings.OPENAI_MODEL, temperature=0, stream_usage=True)
+        self.fallback = (
+            init_chat_model(settings.LLM_FALLBACK_MODEL, temperature=0, stream_usage=True)
+            if settings.LLM_FALLBACK_MODEL else None
+        )
+        self._slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self._health: Optional[HealthStatus] = None
+        self._probe_lock = asyncio.Lock()
+
+    async def ainvoke(
+        self,
+        messages: List[BaseMessage],
+        *,
+        deadline: Optional[float] = None,
+        purpose: str = "chat",
+    ) -> AIMessage:
+        """Call the primary model (falling back if it is slow to start) within the deadline."""
+        remaining = _remaining(deadline)
+        if remaining <= 0:
+            metrics.incr("llm.deadline_exceeded")
+            raise LLMDeadlineExceeded("deadline exceeded before the call was queued")
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(),
+                                   min(remaining, settings.LLM_QUEUE_TIMEOUT_SECONDS))
+        except asyncio.TimeoutError:
+            if remaining < settings.LLM_QUEUE_TIMEOUT_SECONDS:
+                metrics.incr("llm.deadline_exceeded")
+                raise LLMDeadlineExceeded("deadline exceeded while waiting for an LLM slot")
+            metrics.incr("llm.rejected")
+            raise LLMUnavailable("too many LLM calls in flight")
+        metrics.observe("llm.queue_ms", (time.perf_counter() - queued) * 1000)
+        try:
+            remaining = _remaining(deadline)
+            if remaining <= 0:
+                metrics.incr("llm.deadline_exceeded")
+                raise LLMDeadlineExceeded("deadline exceeded before the call started")
+            first_token = remaining
+            if self.fallback is not None:
+                first_token = min(remaining, settings.LLM_FALLBACK_AFTER_SECONDS)
+            try:
+                return await self._call(self.primary, settings.OPENAI_MODEL, messages,
+                                        first_token, remaining, purpose)
+            except _NoFirstToken as e:
+                remaining = _remaining(deadline)
+                if self.fallback is None or remaining <= 0:
+                    raise LLMUnavailable(str(e.__cause__ or e)) from e
+                logger.warning("LLM %s: primary slow or failing (%s), using %s",
+                               purpose, e.__cause__ or e, settings.LLM_FALLBACK_MODEL)
+                metrics.incr("llm.fallback")
+                try:
+                    return await self._call(self.fallback, settings.LLM_FALLBACK_MODEL, messages,
+                                            remaining, remaining, purpose)
+                except _NoFirstToken as e2:
+                    raise LLMUnavailable(str(e2.__cause__ or e2)) from e2
+        finally:
+            self._slots.release()
+
+    async def _call(
+        self,
+        model: Any,
+        name: str,
+        messages: List[BaseMessage],
+        first_token_timeout: float,
+        total_timeout: float,
+        purpose: str,
+    ) -> AIMessage:
+        """Stream one model call and return the aggregated message.
+        Raises _NoFirstToken if nothing arrived in time, so the caller may retry
+        elsewhere; failures after the first token are not retried.
+        """
+        started = time.perf_counter()
+        stream = model.astream(messages).__aiter__()
+        message = None
+        try:
+            try:
+                message = await asyncio.wait_for(stream.__anext__(), first_token_timeout)
+            except StopAsyncIteration:
+                message = None
+            except Exception as e:
+                metrics.incr(f"llm.errors.{name}")
+                self._note(False, name, str(e) or type(e).__name__)
+                raise _NoFirstToken(f"{name} gave no first token") from e
+            metrics.observe(f"llm.ttft_ms.{name}", (time.perf_counter() - started) * 1000)
+
+            async def rest() -> None:
+                nonlocal message
+                async for chunk in stream:
+                    message = chunk if message is None else message + chunk
+
+            try:
+                await asyncio.wait_for(rest(), total_timeout - (time.perf_counter() - started))
+            except asyncio.TimeoutError:
+                metrics.incr("llm.deadline_exceeded")
+                self._note(False, name, "timeout")
+                raise LLMDeadlineExceeded(f"{name} did not finish before the deadline")
+            except Exception as e:
+                metrics.incr(f"llm.errors.{name}")
+                self._note(False, name, str(e) or type(e).__name__)
+                raise
+        finally:
+            try:
+                await stream.aclose()
+            except Exception:
+                pass
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        metrics.observe(f"llm.latency_ms.{name}", latency_ms)
+        usage = getattr(message, "usage_metadata", None) or {}
+        if usage:
+            metrics.incr(f"llm.input_tokens.{name}", int(usage.get("input_tokens", 0)))
+            metrics.incr(f"llm.output_tokens.{name}", int(usage.get("output_tokens", 0)))
+        self._note(True, name, latency_ms=latency_ms)
+        logger.info("LLM %s model=%s latency_ms=%.0f tokens_in=%s tokens_out=%s",
+                    purpose, name, latency_ms, usage.get("input_tokens"), usage.get("output_tokens"))
+        # The aggregated AIMessageChunk is itself an AIMessage
+        return message if message is not None else AIMessage(content="")
+
+    def _note(self, ok: bool, model: str, error: Optional[str] = None,
+              latency_ms: Optional[float] = None) -> None:
+        self._health = HealthStatus(ok=ok, model=model, checked_at=time.monotonic(),
+                                    source="traffic", latency_ms=latency_ms, error=error)
+
+    async def health(self) -> Dict[str, Any]:
+        """Recent health; real traffic counts, otherwise a probe at most every LLM_HEALTH_TTL_SECONDS."""
+        status = self._health
+        if status is not None and time.monotonic() - status.checked_at < settings.LLM_HEALTH_TTL_SECONDS:
+            return status.as_dict()
+        async with self._probe_lock:
+            status = self._health
+            if status is not None and time.monotonic() - status.checked_at < settings.LLM_HEALTH_TTL_SECONDS:
+                return status.as_dict()
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    self.primary.ainvoke([HumanMessage(content="Reply with the word pong.")]),
+                    settings.LLM_HEALTH_TIMEOUT_SECONDS)
+                status = HealthStatus(ok=True, model=settings.OPENAI_MODEL, checked_at=time.monotonic(),
+                                      source="probe", latency_ms=(time.perf_counter() - started) * 1000)
+            except Exception as e:
+                status = HealthStatus(ok=False, model=settings.OPENAI_MODEL, checked_at=time.monotonic(),
+                                      source="probe", error=str(e) or type(e).__name__)
+            self._health = status
+        return status.as_dict()
+
+
+_gateway: Optional[LLMGateway] = None
+_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Process-wide gateway, created on first use."""
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
@@ -0,0 +1,72 @@
+from typing import Any
+import hashlib
+import time
+from app.core.config import settings
+from app.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Cached responses are keyed on a per-user mailbox generation. The sync worker
+# bumps the generation after committing, so readers move to fresh keys at once
+# and old entries simply expire.
+
+
+def _generation_key(user_email: str) -> str:
+    return f"mailbox:gen:{user_email}"
+
+
+def _entry_key(user_email: str, generation: int, parts: tuple[Any, ...]) -> str:
+    return ":".join(["mailcache", user_email, str(generation), *map(str, parts)])
+
+
+async def get_generation(redis, user_email: str) -> int:
+    key = _generation_key(user_email)
+    raw = await redis.get(key)
+    if not raw:
+        # Seed from the clock so a Redis flush never reissues an old generation
+        # (which would let a client's stale ETag match new content)
+        await redis.set(key, int(time.time() * 1000), nx=True)
+        raw = await redis.get(key)
+    return int(raw)
+
+
+async def bump_generation(redis, user_email: str) -> int:
+    await get_generation(redis, user_email)
+    return int(await redis.incr(_generation_key(user_email)))
+
+
+def make_etag(generation: int, *parts: Any) -> str:
+    """Strong ETag for a response: mailbox generation plus the resource key."""
+    digest = hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()[:16]
+    return f'"g{generation}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    # Accept weak forms of our tag too, since proxies may weaken it. "*" is
+    # for conditional writes; on these GETs it must not skip the access check
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+async def get_cached(redis, user_email: str, *parts: Any) -> tuple[bytes | None, int]:
+    """Return (cached payload or None, current generation).
+    The generation must be read before querying the DB and passed to put_cached.
+    """
+    generation = await get_generation(redis, user_email)
+    payload = await redis.get(_entry_key(user_email, generation, parts))
+    return payload, generation
+
+
+async def put_cached(redis, user_email: str, generation: int, payload: bytes, *parts: Any) -> None:
+    await redis.set(
+        _entry_key(user_email, generation, parts),
+        payload,
+        ex=settings.MAIL_CACHE_TTL_SECONDS,
+    )
+
+
+# Key parts shared by the API (reads) and the worker (pre-warm)
+def thread_page_parts(limit: int, cursor: str | None) -> tuple[Any, ...]:
+    return ("threads", "cursor", limit, cursor or "")
@@ -0,0 +1,133 @@
+from app.core.config import settings
+from app.logger_config import get_logger
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any
+import asyncio
+import json
+
+logger = get_logger(__name__)
+
+# The worker publishes per-user events on Redis pub/sub; each API process runs
+# one pattern subscription and fans events out to its connected clients.
+_CHANNEL_PREFIX = "mail:events:"
+
+
+def _channel(user_email: str) -> str:
+    return f"{_CHANNEL_PREFIX}{user_email}"
+
+
+async def publish_event(redis, user_email: str, event: str, data: dict[str, Any]) -> None:
+    """Publish an event for a user; delivery is best effort."""
+    try:
+        await redis.publish(_channel(user_email), json.dumps({"event": event, "data": data}))
+    except Exception as e:
+        logger.warning("Publishing %s event for %s failed: %s",
+                       event, user_email, e)
+
+
+async def set_sync_status(redis, user_email: str, mapping: dict[str, Any]) -> None:
+    """Update the sync:status hash (still served by /sync/status) and push it."""
+    await redis.hset(f"sync:status:{user_email}", mapping=mapping)
+    await publish_event(redis, user_email, "sync", mapping)
+
+
+class Subscription:
+    """One client connection. The queue is bounded: when a slow client falls
+    behind, pending events are dropped and replaced with a single `resync`,
+    so a stalled socket never grows memory or blocks other clients.
+    """
+
+    def __init__(self, user_email: str, max_pending: int):
+        self.user_email = user_email
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def offer(self, message: dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait({"event": "resync", "data": {
+                "reason": "client too slow",
+                "at": datetime.now(timezone.utc).isoformat(),
+            }})
+
+
+class EventHub:
+    """Process-wide fan-out of Redis pub/sub events to local subscriptions."""
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def subscribe(self, user_email: str) -> Subscription:
+        sub = Subscription(user_email, settings.EVENTS_MAX_PENDING)
+        self._subscribers[user_email].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.user_email)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[sub.user_email]
+        if sub.dropped:
+            logger.info("Event subscription for %s dropped %d events",
+                        sub.user_email, sub.dropped)
+
+    def _dispatch(self, channel: str, raw: bytes | str) -> None:
+        user_email = channel[len(_CHANNEL_PREFIX):]
+        subs = self._subscribers.get(user_email)
+        if not subs:
+            return
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        for sub in list(subs):
+            sub.offer(message)
+
+    async def _listen_forever(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{_CHANNEL_PREFIX}*")
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "pmessage":
+                        continue
+                    channel = msg["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self._dispatch(channel, msg["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Event subscription lost, reconnecting: %s", e)
+                # Clients may have missed events while disconnected
+                for subs in list(self._subscribers.values()):
+                    for sub in list(subs):
+                        sub.offer({"event": "resync", "data": {"reason": "reconnected"}})
+                await asyncio.sleep(1.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
@@ -0,0 +1,56 @@
+from collections import deque
+from typing import Any, Deque, Dict
+import threading
+
+# Rolling in-process samples; each API/worker process keeps its own window
+_WINDOW = 500
+_lock = threading.Lock()
+_samples: Dict[str, Deque[float]] = {}
+_counters: Dict[str, int] = {}
+_gauges: Dict[str, float] = {}
+
+
+def observe(name: str, value: float) -> None:
+    """Record one sample (e.g. a latency in ms) for a named series."""
+    with _lock:
+        series = _samples.get(name)
+        if series is None:
+            series = _samples[name] = deque(maxlen=_WINDOW)
+        series.append(value)
+
+
+def incr(name: str, amount: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Overwrite a point-in-time value (e.g. a collection size)."""
+    with _lock:
+        _gauges[name] = value
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Summaries (count/avg/p50/p95/max) for every series plus counters and gauges."""
+    with _lock:
+        series = {k: sorted(v) for k, v in _samples.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    out: Dict[str, Any] = {}
+    for name, values in series.items():
+        n = len(values)
+        out[name] = {
+            "count": n,
+            "avg": round(sum(values) / n, 2) if n else 0.0,
+            "p50": round(_percentile(values, 0.50), 2),
+            "p95": round(_percentile(values, 0.95), 2),
+            "max": round(values[-1], 2) if n else 0.0,
+        }
+    return {"series": out, "counters": counters, "gauges": gauges}
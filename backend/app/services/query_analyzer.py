@@ -0,0 +1,180 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import calendar
+import re
+
+# Rule-based extraction of date and sender constraints from a chat question.
+# It runs on every query, so it stays regex-only (no model call); anything it
+# does not recognise simply leaves retrieval unfiltered.
+
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+_UNITS = {"day": 1, "week": 7, "month": 30, "year": 365}
+_NUMBER_WORDS = {"a": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                 "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+_RELATIVE_RE = re.compile(
+    r"\b(?:in\s+the\s+)?(?:past|last)\s+(\d+|a|one|two|three|four|five|six|seven|eight|nine|ten)\s+"
+    r"(day|week|month|year)s?\b", re.I)
+_NAMED_RE = re.compile(
+    r"\b(today|yesterday|this\s+week|last\s+week|this\s+month|last\s+month|this\s+year|last\s+year)\b", re.I)
+_MONTH_RE = re.compile(r"\bin\s+(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\b(?:\s+(\d{4}))?", re.I)
+_SINCE_RE = re.compile(r"\b(since|after|before)\s+(\d{4}-\d{2}-\d{2})\b", re.I)
+_SENDER_RE = re.compile(
+    r"\b(?i:from|sent\s+by)\s+([\w.+-]+@[\w-]+(?:\.[\w-]+)+|[A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)?|me)\b")
+_SENT_BY_SUBJECT_RE = re.compile(r"\b(?:did|has|have)\s+([A-Z][\w'-]*)\s+(?:send|sent|email|write|wrote)\b")
+_I_SENT_RE = re.compile(r"\b(?:I|i)\s+(?:sent|send|wrote|emailed)\b")
+
+
+@dataclass
+class QueryConstraints:
+    sent_after: Optional[datetime] = None
+    sent_before: Optional[datetime] = None
+    # Raw sender mention ("Alice", "alice@x.com", or "me"); resolved to addresses later
+    sender: Optional[str] = None
+    from_addresses: List[str] = field(default_factory=list)
+    thread_id: Optional[int] = None
+    # The question with the recognised constraint phrases removed
+    residual: str = ""
+
+    @property
+    def has_filters(self) -> bool:
+        return self.has_metadata_filters or self.thread_id is not None
+
+    @property
+    def has_metadata_filters(self) -> bool:
+        # Date/sender filters; chunks indexed before sent_ts/from_address lack them
+        return bool(self.sent_after or self.sent_before or self.from_addresses)
+
+    def scope_only(self) -> "QueryConstraints":
+        """The request's explicit thread scope without the date/sender filters."""
+        return QueryConstraints(thread_id=self.thread_id)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "sent_after": self.sent_after.isoformat() if self.sent_after else None,
+            "sent_before": self.sent_before.isoformat() if self.sent_before else None,
+            "sender": self.sender,
+            "from_addresses": self.from_addresses,
+            "thread_id": self.thread_id,
+        }
+
+
+def _start_of_day(dt: datetime) -> datetime:
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _named_range(phrase: str, now: datetime) -> tuple[datetime, datetime]:
+    phrase = " ".join(phrase.lower().split())
+    today = _start_of_day(now)
+    if phrase == "today":
+        return today, today + timedelta(days=1)
+    if phrase == "yesterday":
+        return today - timedelta(days=1), today
+    week_start = today - timedelta(days=today.weekday())
+    if phrase == "this week":
+        return week_start, today + timedelta(days=1)
+    if phrase == "last week":
+        return week_start - timedelta(days=7), week_start
+    month_start = today.replace(day=1)
+    if phrase == "this month":
+        return month_start, today + timedelta(days=1)
+    if phrase == "last month":
+        return (month_start - timedelta(days=1)).replace(day=1), month_start
+    year_start = today.replace(month=1, day=1)
+    if phrase == "this year":
+        return year_start, today + timedelta(days=1)
+    return year_start.replace(year=year_start.year - 1), year_start
+
+
+def analyze_query(query: str, now: Optional[datetime] = None) -> QueryConstraints:
+    """Extract date range and sender constraints (UTC, naive datetimes like the DB)."""
+    now = now or datetime.utcnow()
+    out = QueryConstraints()
+    residual = query
+
+    m = _RELATIVE_RE.search(query)
+    if m:
+        amount = m.group(1).lower()
+        n = int(amount) if amount.isdigit() else _NUMBER_WORDS[amount]
+        out.sent_after = now - timedelta(days=n * _UNITS[m.group(2).lower()])
+        residual = residual.replace(m.group(0), " ")
+    else:
+        m = _NAMED_RE.search(query)
+        if m:
+            out.sent_after, out.sent_before = _named_range(m.group(1), now)
+            residual = residual.replace(m.group(0), " ")
+        else:
+            m = _MONTH_RE.search(query)
+            if m:
+                month = _MONTHS[m.group(1).lower()]
+                year = int(m.group(2)) if m.group(2) else now.year
+                # A bare month name that is still ahead this year means last year's
+                if not m.group(2) and month > now.month:
+                    year -= 1
+                out.sent_after = datetime(year, month, 1)
+                last_day = calendar.monthrange(year, month)[1]
+                out.sent_before = datetime(year, month, last_day) + timedelta(days=1)
+                residual = residual.replace(m.group(0), " ")
+    for m in _SINCE_RE.finditer(query):
+        try:
+            when = datetime.strptime(m.group(2), "%Y-%m-%d")
+        except ValueError:
+            continue
+        if m.group(1).lower() == "before":
+            out.sent_before = when
+        else:
+            out.sent_after = when
+        residual = residual.replace(m.group(0), " ")
+
+    m = _SENDER_RE.search(query)
+    if m is None and _I_SENT_RE.search(query):
+        out.sender = "me"
+    else:
+        m = m or _SENT_BY_SUBJECT_RE.search(query)
+        if m:
+            out.sender = m.group(1)
+            residual = residual.replace(m.group(0), " ")
+
+    out.residual = " ".join(residual.split())
+    return out
+
+
+def epoch_seconds(dt: datetime) -> int:
+    """Unix time for a naive UTC datetime (the sent_ts chunk metadata)."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def canonical_hex(value: Any) -> str:
+    """Provider hex id as the DB round-trips it (format(int, "x")): lowercase,
+    no leading zeros. Chunk metadata and lexical hits are keyed on this form."""
+    try:
+        return format(int(str(value), 16), "x")
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def thread_id_forms(thread_id: int) -> List[str]:
+    """Metadata values a thread may be stored under: canonical hex, plus the
+    provider's zero-padded raw form found on chunks indexed before canonicalization."""
+    return sorted({format(thread_id, "x"), format(thread_id, "016x"), format(thread_id, "016X")})
+
+
+def build_where(user_email: str, constraints: Optional[QueryConstraints]) -> Dict[str, Any]:
+    """Chroma `where` clause for the user's chunks narrowed by the constraints.
+    Chunks indexed before sent_ts/from_address existed won't match filters.
+    """
+    clauses: List[Dict[str, Any]] = [{"user_email": user_email}]
+    if constraints is not None:
+        if constraints.sent_after:
+            clauses.append({"sent_ts": {"$gte": epoch_seconds(constraints.sent_after)}})
+        if constraints.sent_before:
+            clauses.append({"sent_ts": {"$lt": epoch_seconds(constraints.sent_before)}})
+        if constraints.from_addresses:
+            clauses.append({"from_address": {"$in": constraints.from_addresses}})
+        if constraints.thread_id is not None:
+            clauses.append({"thread_id": {"$in": thread_id_forms(constraints.thread_id)}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
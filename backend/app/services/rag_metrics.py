@@ -0,0 +1,91 @@
+from app.core.config import settings
+from app.logger_config import get_logger
+from app.services import metrics
+from app.services.blocking import run_blocking
+from app.services.vector_store import get_vector_store
+from collections import OrderedDict
+import asyncio
+import random
+import time
+
+logger = get_logger(__name__)
+
+# Users seen by retrieval recently; the refresher only counts these
+_MAX_TRACKED_USERS = 200
+_active_users: "OrderedDict[str, None]" = OrderedDict()
+_user_sizes: dict[str, int] = {}
+_sized_at: dict[str, float] = {}
+_background: set[asyncio.Task] = set()
+
+
+def note_active_user(user_email: str) -> None:
+    _active_users[user_email] = None
+    _active_users.move_to_end(user_email)
+    while len(_active_users) > _MAX_TRACKED_USERS:
+        _active_users.popitem(last=False)
+
+
+async def _count_sizes(user_emails: list[str]) -> tuple[int, dict[str, int]]:
+    store = get_vector_store()
+    collection = store._collection  # type: ignore[attr-defined]
+    total = await run_blocking(collection.count)
+    per_user: dict[str, int] = {}
+    cap = settings.VECTOR_STATS_USER_SIZE_CAP
+    for email in user_emails:
+        # count() takes no filter; fetch ids only for the user's slice, capped
+        # (a size equal to the cap means "at least")
+        got = await run_blocking(collection.get, where={"user_email": email}, include=[], limit=cap)
+        per_user[email] = len(got.get("ids") or [])
+    return total, per_user
+
+
+def _due_users() -> list[str]:
+    """The tracked users whose sizes are stalest, VECTOR_STATS_USERS_PER_REFRESH at most."""
+    users = sorted(_active_users, key=lambda e: _sized_at.get(e, 0.0))
+    return users[:settings.VECTOR_STATS_USERS_PER_REFRESH]
+
+
+async def _log_sampled_diag(user_email: str) -> None:
+    try:
+        total, per_user = await _count_sizes([user_email])
+        logger.info("RAG retrieve diag: total=%s per_user=%s user=%s",
+                    total, per_user.get(user_email), user_email)
+    except Exception as e:
+        logger.debug("RAG diag sample failed: %s", e)
+
+
+def user_size(user_email: str) -> int | None:
+    """Last refreshed chunk count for a user, if they were tracked."""
+    return _user_sizes.get(user_email)
+
+
+def maybe_sample_diag(user_email: str) -> None:
+    """Off the hot path: schedule the expensive counts for a sampled fraction of requests."""
+    rate = settings.RAG_DIAG_SAMPLE_RATE
+    if rate <= 0 or random.random() >= rate:
+        return
+    task = asyncio.create_task(_log_sampled_diag(user_email))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def refresh_vector_stats_forever() -> None:
+    """Periodically publish collection and per-user sizes as gauges."""
+    interval = settings.VECTOR_STATS_REFRESH_SECONDS
+    while True:
+        try:
+            total, per_user = await _count_sizes(_due_users())
+            metrics.set_gauge("vector.collection_size", total)
+            # Per-user sizes stay out of the shared gauges so callers only see their own
+            now = time.monotonic()
+            _user_sizes.update(per_user)
+            _sized_at.update(dict.fromkeys(per_user, now))
+            for email in [e for e in _user_sizes if e not in _active_users]:
+                _user_sizes.pop(email, None)
+                _sized_at.pop(email, None)
+            metrics.set_gauge("vector.tracked_users", len(_user_sizes))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Vector stats refresh failed: %s", e)
+        await asyncio.sleep(interval)
@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.crud import escape_like
+from app.services.query_analyzer import QueryConstraints, analyze_query
+import re
+
+# Questions that are really metadata lookups ("how many emails from X",
+# "latest email from my bank", "open threads this week") are answered with SQL.
+# The classifier is keyword-based so routing costs microseconds; anything it
+# does not recognise goes through normal retrieval.
+
+_COUNT_RE = re.compile(r"\bhow\s+many\s+(?:\w+\s+){0,2}(emails?|messages?|mails?|threads?|conversations?)\b", re.I)
+_LATEST_RE = re.compile(
+    r"\b(?:latest|last|most\s+recent|newest)\s+(?!(?:day|week|month|year)s?\b)(?:\w+\s+)?(?:emails?|messages?|mails?)\b", re.I)
+_OPEN_RE = re.compile(r"\b(?:unread|open|pending|not\s+done|unanswered)\s+(?:emails?|messages?|threads?|conversations?)\b", re.I)
+# "latest email" questions about what it says need the body, so they go to RAG
+_CONTENT_RE = re.compile(
+    r"\b(?:say|says|said|write|wrote|written|mention\w*|about|ask\w*|want\w*|need\w*|request\w*"
+    r"|content|body|details?|summar\w*|explain\w*|mean\w*|why|how\s+much)\b", re.I)
+# Looser sender phrase for lookups ("from my bank"); matched against names/addresses
+_SENDER_PHRASE_RE = re.compile(
+    r"\bfrom\s+(?:my\s+|the\s+)?([\w@.'-]+(?:\s+[\w@.'-]+)?)"
+    r"(?=\s+(?:this|last|in|since|before|after|today|yesterday|during|past)\b|\s*[?.!]?\s*$)", re.I)
+
+_MAX_LISTED = 10
+
+
+@dataclass
+class StructuredIntent:
+    kind: str  # "count" | "latest" | "open_threads"
+    constraints: QueryConstraints
+    # Unit asked about in count questions: "emails" or "threads"
+    unit: str = "emails"
+    sender_like: Optional[str] = None
+
+
+def classify_intent(query: str) -> Optional[StructuredIntent]:
+    """Return a structured intent for lookup-style questions, else None."""
+    if _OPEN_RE.search(query):
+        intent = StructuredIntent("open_threads", analyze_query(query), unit="threads")
+    else:
+        m = _COUNT_RE.search(query)
+        kind = "count" if m else ("latest" if _LATEST_RE.search(query) else None)
+        # Only pure metadata lookups (who/when/which subject) for "latest"
+        if kind is None or (kind == "latest" and _CONTENT_RE.search(query)):
+            return None
+        unit = "threads" if m and m.group(1).lower().startswith(("thread", "conversation")) else "emails"
+        intent = StructuredIntent(kind, analyze_query(query), unit=unit)
+    if not intent.constraints.sender:
+        sm = _SENDER_PHRASE_RE.search(query)
+        if sm:
+            intent.sender_like = sm.group(1)
+    return intent
+
+
+def _email_filters(intent: StructuredIntent, params: Dict[str, Any], dates: bool = True) -> str:
+    c = intent.constraints
+    clauses: List[str] = []
+    if dates and c.sent_after:
+        clauses.append('e."sentAt" >= :sent_after')
+        params["sent_after"] = c.sent_after
+    if dates and c.sent_before:
+        clauses.append('e."sentAt" < :sent_before')
+        params["sent_before"] = c.sent_before
+    if c.from_addresses:
+        clauses.append("ea.address = ANY(:from_addresses)")
+        params["from_addresses"] = c.from_addresses
+    elif intent.sender_like or c.sender:
+        clauses.append("(ea.address ILIKE :sender_like OR ea.name ILIKE :sender_like)")
+        params["sender_like"] = f"%{escape_like(intent.sender_like or c.sender)}%"
+    if c.thread_id is not None:
+        clauses.append('e."threadId" = :thread_id')
+        params["thread_id"] = c.thread_id
+    return "".join(f" AND {clause}" for clause in clauses)
+
+
+_USER_ID = "(SELECT id FROM users WHERE email = :user_email)"
+
+
+def _source(row) -> Dict[str, Any]:
+    return {
+        "email_id": format(row.id, "x") if getattr(row, "id", None) is not None else None,
+        "thread_id": format(row.thread_id, "x"),
+        "subject": row.subject,
+        "snippet": getattr(row, "preview", None) or "",
+        "sent_at": row.sent_at.isoformat() if row.sent_at else "",
+    }
+
+
+async def run_structured(session: AsyncSession, user_email: str, intent: StructuredIntent) -> Dict[str, Any]:
+    """Execute the intent as parameterized SQL scoped to the user's threads.
+    Returns {"facts": ..., "sources": [...]} for phrasing and citation.
+    """
+    c = intent.constraints
+    params: Dict[str, Any] = {"user_email": user_email}
+    filters_desc = c.as_dict()
+    if intent.sender_like:
+        filters_desc["sender"] = intent.sender_like
+
+    if intent.kind == "open_threads":
+        date_sql = ""
+        if c.sent_after:
+            date_sql += ' AND ut."lastMessageDate" >= :sent_after'
+            params["sent_after"] = c.sent_after
+        if c.sent_before:
+            date_sql += ' AND ut."lastMessageDate" < :sent_before'
+            params["sent_before"] = c.sent_before
+        # Sender/thread constraints: the thread has a matching message
+        email_sql = _email_filters(intent, params, dates=False)
+        if email_sql:
+            date_sql += f"""
+              AND EXISTS (
+                SELECT 1 FROM emails e JOIN email_addresses ea ON ea.id = e."fromId"
+                WHERE e."threadId" = ut.thread_id{email_sql})"""
+        rows = (await session.execute(text(f"""
+            SELECT t.id AS thread_id, t.subject, ut."lastMessageDate" AS sent_at,
+                   count(*) OVER () AS total
+            FROM user_threads ut
+            JOIN threads t ON t.id = ut.thread_id
+            WHERE ut.user_id = {_USER_ID} AND NOT ut.done AND ut."inboxStatus"{date_sql}
+            ORDER BY ut."lastMessageDate" DESC
+            LIMIT {_MAX_LISTED}
+        """), params)).all()
+        total = rows[0].total if rows else 0
+        return {
+            "facts": {"open_inbox_threads": total, "filters": filters_desc,
+                      "most_recent": [{"subject": r.subject, "last_message": r.sent_at.isoformat()} for r in rows]},
+            "sources": [_source(r) for r in rows],
+        }
+
+    where = _email_filters(intent, params)
+    base = f"""
+        FROM emails e
+        JOIN user_threads ut ON ut.thread_id = e."threadId" AND ut.user_id = {_USER_ID}
+        JOIN email_addresses ea ON ea.id = e."fromId"
+        WHERE TRUE{where}
+    """
+    if intent.kind == "count":
+        counted = 'count(DISTINCT e."threadId")' if intent.unit == "threads" else "count(*)"
+        total = (await session.execute(text(f"SELECT {counted} {base}"), params)).scalar_one()
+        return {"facts": {f"{intent.unit}_count": total, "filters": filters_desc}, "sources": []}
+
+    row = (await session.execute(text(f"""
+        SELECT e.id, e."threadId" AS thread_id, e.subject, e."sentAt" AS sent_at,
+               ea.name AS from_name, ea.address AS from_address,
+               left(coalesce(e.body, ''), 280) AS preview
+        {base}
+        ORDER BY e."sentAt" DESC
+        LIMIT 1
+    """), params)).first()
+    if row is None:
+        return {"facts": {"latest_email": None, "filters": filters_desc}, "sources": []}
+    return {
+        "facts": {"latest_email": {
+            "subject": row.subject,
+            "from": f"{row.from_name} <{row.from_address}>" if row.from_name else row.from_address,
+            "sent_at": row.sent_at.isoformat(),
+            "preview": row.preview,
+        }, "filters": filters_desc},
+        "sources": [_source(row)],
+    }
+
+
+def fallback_phrase(intent: StructuredIntent, facts: Dict[str, Any]) -> str:
+    """Plain answer used when the LLM is unavailable."""
+    if intent.kind == "count":
+        return f"{facts.get(f'{intent.unit}_count', 0)} {intent.unit} match."
+    if intent.kind == "open_threads":
+        return f"You have {facts.get('open_inbox_threads', 0)} open inbox threads."
+    latest = facts.get("latest_email")
+    if not latest:
+        return "I couldn't find a matching email."
+    return f"The latest matching email is \"{latest['subject']}\" from {latest['from']} ({latest['sent_at']})."
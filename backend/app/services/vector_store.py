@@ -3,31 +3,100 @@ from langchain_chroma import Chroma
 from app.core.config import settings
 from app.logger_config import get_logger
 from pathlib import Path
+import threading
+import httpx
 import os
 
 
 logger = get_logger(__name__)
 
+# Process-level registry: one embedding client and one Chroma handle per collection
+_lock = threading.Lock()
+_embeddings: OpenAIEmbeddings | None = None
+_http_client: httpx.Client | None = None
+_http_async_client: httpx.AsyncClient | None = None
+_stores: dict[str, Chroma] = {}
 
-def get_vector_store(collection_name: str = "emails") -> Chroma:
+
+def _persist_dir() -> str:
     # Use a stable absolute directory so API and worker see the same data
     env_dir = os.getenv("CHROMA_PERSIST_DIR")
     default_dir = (Path(__file__).resolve(
     ).parents[2] / "chroma_langchain_db").as_posix()
-    persist_dir = env_dir if env_dir else default_dir
-    embeddings = OpenAIEmbeddings(
-        model=settings.EMBEDDING_MODEL, api_key=settings.OPENAI_API_KEY
-    )
-    store = Chroma(
-        collection_name=collection_name,
-        embedding_function=embeddings,
-        persist_directory=persist_dir,
-    )
-    # Lightweight debug to help diagnose zero-retrieval situations
-    try:
-        count = store._collection.count()  # type: ignore[attr-defined]
-        logger.debug("Chroma store ready collection=%s dir=%s count=%s",
-                     collection_name, persist_dir, count)
-    except Exception:
-        pass
+    return env_dir if env_dir else default_dir
+
+
+def _get_embeddings() -> OpenAIEmbeddings:
+    """Build the shared embedding client once; callers must hold _lock."""
+    global _embeddings, _http_client, _http_async_client
+    if _embeddings is None:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        timeout = httpx.Timeout(
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            read=settings.HTTP_READ_TIMEOUT,
+            write=settings.HTTP_WRITE_TIMEOUT,
+            pool=settings.HTTP_POOL_TIMEOUT,
+        )
+        _http_client = httpx.Client(limits=limits, timeout=timeout)
+        _http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        _embeddings = OpenAIEmbeddings(
+            model=settings.EMBEDDING_MODEL,
+            api_key=settings.OPENAI_API_KEY,
+            http_client=_http_client,
+            http_async_client=_http_async_client,
+        )
+    return _embeddings
+
+
+def get_vector_store(collection_name: str = "emails") -> Chroma:
+    """Return the process-wide Chroma store for a collection, creating it lazily."""
+    store = _stores.get(collection_name)
+    if store is not None:
+        return store
+    with _lock:
+        store = _stores.get(collection_name)
+        if store is not None:
+            return store
+        persist_dir = _persist_dir()
+        store = Chroma(
+            collection_name=collection_name,
+            embedding_function=_get_embeddings(),
+            persist_directory=persist_dir,
+        )
+        _stores[collection_name] = store
+    # Counting scans the collection, so only do it when explicitly enabled
+    if settings.VECTOR_STORE_DEBUG_COUNTS:
+        try:
+            count = store._collection.count()  # type: ignore[attr-defined]
+            logger.debug("Chroma store ready collection=%s dir=%s count=%s",
+                         collection_name, persist_dir, count)
+        except Exception:
+            pass
+    else:
+        logger.debug("Chroma store ready collection=%s dir=%s",
+                     collection_name, persist_dir)
     return store
+
+
+async def close_vector_stores() -> None:
+    """Release the shared embedding HTTP connections and drop cached stores."""
+    global _embeddings, _http_client, _http_async_client
+    with _lock:
+        http_client, http_async_client = _http_client, _http_async_client
+        _stores.clear()
+        _embeddings = None
+        _http_client = None
+        _http_async_client = None
+    if http_async_client is not None:
+        try:
+            await http_async_client.aclose()
+        except Exception:
+            pass
+    if http_client is not None:
+        try:
+            http_client.close()
+        except Exception:
+            pass
@@ -5,12 +5,17 @@ from app.core.db import AsyncSessionLocal
 from sqlalchemy import select
 from app.models import DbUser, User
 from app.logger_config import get_logger, setup_logging
-from app.crud import sync_emails_and_threads, delete_emails_by_ids
+from app.crud import sync_emails_and_threads, delete_emails_by_ids, reconcile_folder_counts, user_emails_for_threads, get_thread_page, prune_thread_changes, parse_dt
+from app.services.mail_cache import bump_generation, get_generation, put_cached, thread_page_parts
+from app.services.mail_events import publish_event, set_sync_status
 from app.api.routes.auth import init_sync_emails, increment_sync_updated, increment_sync_deleted
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import asyncio
 from langchain_core.documents import Document
-from app.services.vector_store import get_vector_store
+from app.services.vector_store import get_vector_store, close_vector_stores
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.query_analyzer import canonical_hex, epoch_seconds
+from app.services.chat_memory import prune_conversations
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 setup_logging()
@@ -33,6 +38,30 @@ async def release_user_lock(redis, account_id: str) -> None:
     await redis.delete(f"locks:sync:{account_id}")
 
 
+async def invalidate_mailboxes(redis, session, user_email: str, thread_ids: set[int]) -> None:
+    """Bump cache generations for everyone sharing the changed threads and pre-warm
+    the syncing user's first inbox page so the next poll is a cache hit."""
+    try:
+        emails = set(await user_emails_for_threads(session, thread_ids))
+        emails.add(user_email)
+        # Push ids only; clients fetch details through the change feed
+        payload = {"threadIds": [format(t, "x") for t in sorted(thread_ids)[:200]],
+                   "count": len(thread_ids)}
+        for email in emails:
+            await bump_generation(redis, email)
+            await publish_event(redis, email, "threads", payload)
+        limit = settings.MAIL_CACHE_PREWARM_LIMIT
+        generation = await get_generation(redis, user_email)
+        page = await get_thread_page(session, user_email, limit)
+        await put_cached(redis, user_email, generation,
+                         page.model_dump_json().encode(), *thread_page_parts(limit, None))
+        logger.info("Bumped mailbox generation for %d users; pre-warmed %s",
+                    len(emails), user_email)
+    except Exception as e:
+        logger.error("Mailbox cache invalidation failed for %s: %s",
+                     user_email, e)
+
+
 async def sync_emails_task(ctx, user_email: str):
     redis = ctx["redis"]
     async with AsyncSessionLocal() as session:
@@ -49,9 +78,9 @@ async def sync_emails_task(ctx, user_email: str):
 
         try:
             # mark status as running
-            await redis.hset(
-                f"sync:status:{user_email}",
-                mapping={
+            await set_sync_status(
+                redis, user_email,
+                {
                     "state": "running",
                     "processed": 0,
                     "updatedAt": datetime.now(timezone.utc).isoformat(),
@@ -85,9 +114,19 @@ async def sync_emails_task(ctx, user_email: str):
                 records=records,
             )
 
-            # Persist updated token
-            db_user.lastUpdatedDeltaToken = last_updated_token
+            # Persist the token this run started from; it only advances to
+            # last_updated_token once the records are indexed (below), so a
+            # failed embedding run fetches the same records again next sync
+            db_user.lastUpdatedDeltaToken = updated_token
             await session.commit()
+            await set_sync_status(
+                redis, user_email,
+                {
+                    "state": "running",
+                    "fetched": len(records),
+                    "updatedAt": datetime.now(timezone.utc).isoformat(),
+                },
+            )
 
             # Fetch deleted records since same delta token
             deleted_ids: list[str] = []
@@ -97,10 +136,11 @@ async def sync_emails_task(ctx, user_email: str):
                 deleted_ids=deleted_ids,
             )
             # Remove from DB
+            changed_thread_ids: set[int] = set()
             if deleted_ids:
                 logger.info("Deleting %d emails for %s",
                             len(deleted_ids), db_user.email)
-                await delete_emails_by_ids(session, deleted_ids)
+                await delete_emails_by_ids(session, deleted_ids, thread_ids_out=changed_thread_ids)
             # Persist deleted token
             db_user.lastDeletedDeltaToken = last_deleted_token
             await session.commit()
@@ -108,20 +148,29 @@ async def sync_emails_task(ctx, user_email: str):
             try:
                 if deleted_ids:
                     store = get_vector_store()
+                    # Older chunks carry the provider's raw id, newer ones the canonical form
+                    ids = sorted({*map(str, deleted_ids), *map(canonical_hex, deleted_ids)})
                     where = {"user_email": db_user.email,
-                             "email_id": {"$in": deleted_ids}}
+                             "email_id": {"$in": ids}}
                     await asyncio.to_thread(store.delete, where=where)
             except Exception:
                 pass
 
             # Persist email records
-            await sync_emails_and_threads(session, records, db_user, account_token=db_user.accountToken)
+            changed_thread_ids |= await sync_emails_and_threads(session, records, db_user, account_token=db_user.accountToken)
             logger.info(
                 "Synced %d email records and updated tokens for user %s",
                 len(records),
                 db_user.accountId,
             )
+            # Data is committed: move every affected mailbox to a new cache generation
+            if records or deleted_ids:
+                await invalidate_mailboxes(
+                    redis, session, db_user.email, changed_thread_ids)
+
             # Index into Chroma vector store using LangChain Documents
+            embed_stats = None
+            indexed = True
             try:
                 if records:
                     store = get_vector_store()
@@ -131,13 +180,19 @@ async def sync_emails_task(ctx, user_email: str):
                                 (r.get("body") or r.get("bodySnippet") or "")).strip()
                         if not text:
                             continue
+                        sender = r.get("from") or {}
+                        sent_at = parse_dt(r.get("sentAt"))
                         meta = {
                             "user_email": db_user.email,
-                            "email_id": r.get("id"),
-                            "thread_id": r.get("threadId"),
+                            "email_id": canonical_hex(r.get("id")),
+                            "thread_id": canonical_hex(r.get("threadId")),
                             "subject": r.get("subject") or "",
                             "snippet": r.get("bodySnippet") or "",
                             "sent_at": r.get("sentAt") or "",
+                            # Filterable fields for retrieval pre-filters
+                            "sent_ts": epoch_seconds(sent_at) if sent_at else 0,
+                            "from_address": sender.get("address") or "",
+                            "from_name": sender.get("name") or "",
                         }
                         docs.append(Document(page_content=text, metadata=meta))
                     docs_splitter = RecursiveCharacterTextSplitter(
@@ -146,15 +201,20 @@ async def sync_emails_task(ctx, user_email: str):
                         chunk_overlap=150,
                         length_function=len,
                         is_separator_regex=False,
+                        # Lets retrieval merge neighbouring chunks without their overlap
+                        add_start_index=True,
                     )
                     docs_split = docs_splitter.split_documents(docs)
                     logger.info(
                         "Indexed %d docs and persisted for %s", len(
                             docs_split), db_user.email
                     )
-                    await store.aadd_documents(documents=docs_split)
-                    logger.info("Added %d docs to vector store",
-                                len(docs_split))
+                    embed_stats = await EmbeddingBatcher(store).index_documents(docs_split)
+                    logger.info("Added %d/%d docs to vector store (%.1f tokens/sec, %.2f chunks/sec)",
+                                embed_stats.chunks, len(docs_split),
+                                embed_stats.tokens_per_sec, embed_stats.chunks_per_sec)
+                    if embed_stats.failed_batches:
+                        indexed = False
 
                     # if docs:
                     #     await asyncio.to_thread(store.add_documents, docs)
@@ -168,24 +228,43 @@ async def sync_emails_task(ctx, user_email: str):
                     #             docs), db_user.email
                     #     )
             except Exception as e:
+                indexed = False
                 logger.error("Vector indexing failed: %s", e)
+            if not indexed:
+                await set_sync_status(
+                    redis, user_email,
+                    {"failedEmailIds": sorted(embed_stats.failed_email_ids) if embed_stats else []},
+                )
+                # Chunk ids are stable, so re-indexing the refetched records is idempotent
+                raise RuntimeError("Vector indexing incomplete; records will be fetched again on the next sync")
+            db_user.lastUpdatedDeltaToken = last_updated_token
+            await session.commit()
 
             # (Removed legacy PGVector indexing path)
 
             # update status to done
-            await redis.hset(
-                f"sync:status:{user_email}",
-                mapping={
+            await set_sync_status(
+                redis, user_email,
+                {
                     "state": "done",
                     "processed": len(records),
                     "updatedAt": datetime.now(timezone.utc).isoformat(),
                 },
             )
+            if embed_stats is not None:
+                await set_sync_status(
+                    redis, user_email,
+                    {
+                        "indexedChunks": embed_stats.chunks,
+                        "embedTokensPerSec": round(embed_stats.tokens_per_sec, 1),
+                        "embedChunksPerSec": round(embed_stats.chunks_per_sec, 2),
+                    },
+                )
         except Exception as e:
             # record error status
-            await redis.hset(
-                f"sync:status:{user_email}",
-                mapping={
+            await set_sync_status(
+                redis, user_email,
+                {
                     "state": "error",
                     "error": str(e),
                     "updatedAt": datetime.now(timezone.utc).isoformat(),
@@ -196,6 +275,40 @@ async def sync_emails_task(ctx, user_email: str):
             await release_user_lock(redis, db_user.accountId)
 
 
+async def reconcile_folder_counts_task(ctx):
+    """Nightly drift repair for the per-user folder counters."""
+    async with AsyncSessionLocal() as session:
+        user_ids = (await session.execute(select(DbUser.id))).scalars().all()
+        fixed = 0
+        for user_id in user_ids:
+            try:
+                fixed += await reconcile_folder_counts(session, user_id)
+            except Exception as e:
+                await session.rollback()
+                logger.error(
+                    "Folder count reconciliation failed for user %s: %s", user_id, e)
+    logger.info("Reconciled folder counts for %d users, corrected %d rows",
+                len(user_ids), fixed)
+
+
+async def prune_thread_changes_task(ctx):
+    """Daily retention for the thread change log."""
+    cutoff = datetime.utcnow() - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS)
+    async with AsyncSessionLocal() as session:
+        pruned = await prune_thread_changes(session, cutoff)
+    logger.info("Pruned %d thread change rows older than %s", pruned, cutoff)
+
+
+async def prune_conversations_task(ctx):
+    """Daily retention for chat memory checkpoints."""
+    now = datetime.now(timezone.utc)
+    idle_before = now - timedelta(days=settings.CHAT_MEMORY_RETENTION_DAYS)
+    async with AsyncSessionLocal() as session:
+        deleted, compacted = await prune_conversations(session, idle_before, now - timedelta(hours=1))
+    logger.info("Chat memory retention: deleted %d idle conversations, compacted %d",
+                deleted, compacted)
+
+
 async def startup(ctx):
     logger.info("ARQ worker startup: functions=%s", [
                 f.__name__ for f in WorkerSettings.functions])
@@ -206,11 +319,25 @@ async def startup(ctx):
         logger.exception("Redis ping failed: %s", e)
 
 
+async def shutdown(ctx):
+    logger.info("ARQ worker shutdown: releasing vector store clients")
+    await close_vector_stores()
+
+
 class WorkerSettings:
-    functions = [sync_emails_task]
+    functions = [sync_emails_task, reconcile_folder_counts_task,
+                 prune_thread_changes_task, prune_conversations_task]
     on_startup = startup
+    on_shutdown = shutdown
     redis_settings = RedisSettings.from_dsn(settings.REDIS_URL)
-    cron_jobs = []
+    cron_jobs = [
+        cron(reconcile_folder_counts_task, hour={3}, minute={15},
+             run_at_startup=False, unique=True),
+        cron(prune_thread_changes_task, hour={3}, minute={45},
+             run_at_startup=False, unique=True),
+        cron(prune_conversations_task, hour={4}, minute={0},
+             run_at_startup=False, unique=True),
+    ]
     # Increase how long the worker waits between polling Redis for new jobs to reduce idle CPU usage.
     # Read from optional env var ARQ_POLL_DELAY_SECONDS; default to 5 seconds if not provided.
     poll_delay = float(getattr(settings, "ARQ_POLL_DELAY_SECONDS", 5.0))
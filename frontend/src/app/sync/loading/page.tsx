@@ -22,27 +22,44 @@ export default function SyncLoadingPage() {
 
   useEffect(() => {
     let cancelled = false;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    const apply = (data: typeof state) => {
+      if (cancelled) return;
+      setState((prev) => ({ ...prev, ...data }));
+      if (data.state === "done") {
+        window.location.href = "/inbox";
+      }
+    };
+    // Fallback when the push stream is unavailable
     const poll = async () => {
       try {
         const resp = await fetch(`${backend}/sync/status`, {
           credentials: "include",
         });
-        const data = await resp.json();
-        if (!cancelled) {
-          setState(data);
-          if (data.state === "done") {
-            window.location.href = "/inbox";
-          }
-        }
+        apply(await resp.json());
       } catch {
         // ignore transient errors, will retry
       } finally {
-        if (!cancelled) setTimeout(poll, 20000);
+        if (!cancelled) timer = setTimeout(poll, 20000);
+      }
+    };
+
+    // Progress is pushed by the server; EventSource reconnects on its own
+    const source = new EventSource(`${backend}/sync/events`, {
+      withCredentials: true,
+    });
+    source.addEventListener("sync", (e) => {
+      apply(JSON.parse((e as MessageEvent).data));
+    });
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED && !cancelled && !timer) {
+        poll();
       }
     };
-    poll();
     return () => {
       cancelled = true;
+      source.close();
+      if (timer) clearTimeout(timer);
     };
   }, [backend]);
 
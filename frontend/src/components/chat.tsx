@@ -51,6 +51,8 @@ export function Chat({ onEmailSelect }: ChatProps) {
   const [error, setError] = useState<string | null>(null);
   const scrollAreaRef = useRef<HTMLDivElement>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Server-side conversation memory; sent with each message after the first reply
+  const conversationIdRef = useRef<string | null>(null);
 
   const scrollToBottom = () => {
     setTimeout(() => {
@@ -124,14 +126,56 @@ export function Chat({ onEmailSelect }: ChatProps) {
         method: "POST",
         credentials: "include",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: userMessage.content }),
+        body: JSON.stringify({
+          message: userMessage.content,
+          conversation_id: conversationIdRef.current ?? undefined,
+        }),
       });
       if (!resp.ok || !resp.body) throw new Error(`HTTP ${resp.status}`);
 
       const reader = resp.body.getReader();
       const decoder = new TextDecoder();
+      const assistantId = (Date.now() + 1).toString();
       let buffer = "";
-      const lines: string[] = [];
+      let answer = "";
+      let sources: EmailSource[] = [];
+      let started = false;
+
+      // Render the assistant message as soon as the first event arrives
+      const upsertAssistant = () => {
+        const assistantMessage: ChatMessage = {
+          id: assistantId,
+          type: "assistant",
+          content: answer,
+          sources,
+          timestamp: new Date(),
+        };
+        const exists = started;
+        setMessages((prev) =>
+          exists
+            ? prev.map((m) => (m.id === assistantId ? assistantMessage : m))
+            : [...prev, assistantMessage]
+        );
+        started = true;
+      };
+
+      const handleLine = (line: string) => {
+        const payload = JSON.parse(line);
+        if (payload.type === "sources") {
+          sources = payload.data || [];
+        } else if (payload.type === "delta") {
+          answer += payload.data || "";
+        } else if (payload.type === "final") {
+          const data = payload.data || {};
+          answer = data.answer || answer;
+          sources = data.sources || sources;
+          if (data.conversation_id) conversationIdRef.current = data.conversation_id;
+        } else if (payload.type === "error") {
+          throw new Error(payload.message || "Stream error");
+        }
+        upsertAssistant();
+      };
+
       while (true) {
         const { value, done } = await reader.read();
         if (done) break;
@@ -140,24 +184,11 @@ export function Chat({ onEmailSelect }: ChatProps) {
         while ((idx = buffer.indexOf("\n")) >= 0) {
           const line = buffer.slice(0, idx).trim();
           buffer = buffer.slice(idx + 1);
-          if (line) lines.push(line);
+          if (line) handleLine(line);
         }
       }
-      const last = lines.pop();
-      const payload = last
-        ? JSON.parse(last)
-        : { type: "final", data: { answer: "", sources: [] } };
-      const data = payload.data || {};
-
-      const assistantMessage: ChatMessage = {
-        id: (Date.now() + 1).toString(),
-        type: "assistant",
-        content: data.answer || "",
-        sources: data.sources || [],
-        timestamp: new Date(),
-      };
-
-      setMessages((prev) => [...prev, assistantMessage]);
+      if (buffer.trim()) handleLine(buffer.trim());
+      if (!started) upsertAssistant();
     } catch (error) {
       console.error("Error sending message:", error);
       setError("Failed to send message. Please try again.");
@@ -32,27 +32,34 @@ interface UsePaginatedThreadsResult {
 
 const ITEMS_PER_PAGE = 20;
 
+interface ThreadPage {
+  threads: Thread[];
+  nextCursor: string | null;
+}
+
 export function usePaginatedThreads(): UsePaginatedThreadsResult {
-  const [currentPage, setCurrentPage] = useState(1);
+  // Keyset pagination: each page is addressed by the cursor returned with the previous one
+  const [cursor, setCursor] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [allThreads, setAllThreads] = useState<Thread[]>([]);
   const [hasMore, setHasMore] = useState(true);
   const [isLoadingMore, setIsLoadingMore] = useState(false);
   const loadingRef = useRef(false);
 
   const base = getApiBaseUrl();
-  // Fetch data for the current page
+  // Fetch data for the current cursor
   const params = new URLSearchParams({
-    page: currentPage.toString(),
     limit: ITEMS_PER_PAGE.toString(),
   });
+  if (cursor) params.set("cursor", cursor);
 
   const {
     data: pageData,
     error,
     isLoading,
     mutate
-  } = useSWR<Thread[]>(
-    `${base}/mail/threads?${params.toString()}`,
+  } = useSWR<ThreadPage>(
+    `${base}/mail/threads/cursor?${params.toString()}`,
     fetcher,
     {
       // Frontend freshness strategy: revalidate on focus
@@ -66,59 +73,63 @@ export function usePaginatedThreads(): UsePaginatedThreadsResult {
     }
   );
 
-  // Independently poll page 1 and merge any new threads at the top
-  const { data: firstPage } = useSWR<Thread[]>(
-    `${base}/mail/threads?page=1&limit=${ITEMS_PER_PAGE}`,
+  // Independently poll the first page and merge any new threads at the top
+  const { data: firstPage, mutate: mutateFirstPage } = useSWR<ThreadPage>(
+    `${base}/mail/threads/cursor?limit=${ITEMS_PER_PAGE}`,
     fetcher,
     {
       revalidateOnFocus: true,
       revalidateOnReconnect: true,
-      refreshInterval: 30000,
-      dedupingInterval: 15000,
+      // Pushed `threads` events trigger revalidation; this is only a safety net
+      refreshInterval: 300000,
+      dedupingInterval: 1000,
     }
   );
 
-  // Update allThreads when new page data arrives
+  // Revalidate page 1 as soon as the server reports changed threads
   useEffect(() => {
-    console.log('Page data effect triggered:', {
-      pageData: pageData?.length,
-      currentPage,
-      error,
-      isLoading
+    const source = new EventSource(`${base}/sync/events`, {
+      withCredentials: true,
     });
-    
+    const onChange = () => {
+      mutateFirstPage();
+    };
+    source.addEventListener("threads", onChange);
+    source.addEventListener("resync", onChange);
+    return () => source.close();
+  }, [base, mutateFirstPage]);
+
+  // Update allThreads when new page data arrives
+  useEffect(() => {
     if (pageData) {
-      if (currentPage === 1) {
-        console.log('Setting initial threads:', pageData.length);
+      const pageThreads = pageData.threads;
+      if (cursor === null) {
         // First page - replace all threads
-        setAllThreads(pageData);
+        setAllThreads(pageThreads);
       } else {
-        console.log('Appending new threads to existing:', pageData.length);
         // Subsequent pages - append to existing threads
         setAllThreads(prev => {
           // Avoid duplicates by filtering out threads that already exist
-      const existingIds = new Set(prev.map(thread => String(thread.id)));
-      const newThreads = pageData.filter(thread => !existingIds.has(String(thread.id)));
-          console.log('New unique threads to add:', newThreads.length);
+          const existingIds = new Set(prev.map(thread => String(thread.id)));
+          const newThreads = pageThreads.filter(thread => !existingIds.has(String(thread.id)));
           return [...prev, ...newThreads];
         });
       }
 
-      // Check if we have more data to load
-      const hasMoreData = pageData.length === ITEMS_PER_PAGE;
-      console.log('Setting hasMore to:', hasMoreData, 'based on pageData length:', pageData.length);
-      setHasMore(hasMoreData);
+      setNextCursor(pageData.nextCursor);
+      setHasMore(pageData.nextCursor !== null);
       setIsLoadingMore(false);
       loadingRef.current = false;
     }
-  }, [pageData, currentPage, error, isLoading]);
+  }, [pageData, cursor]);
 
   // Merge fresh page-1 items to the top without resetting pagination
   useEffect(() => {
-    if (!firstPage || firstPage.length === 0) return;
+    const fresh = firstPage?.threads;
+    if (!fresh || fresh.length === 0) return;
     setAllThreads(prev => {
       const existingIds = new Set(prev.map(t => String(t.id)));
-      const newOnTop = firstPage.filter(t => !existingIds.has(String(t.id)));
+      const newOnTop = fresh.filter(t => !existingIds.has(String(t.id)));
       if (newOnTop.length === 0) return prev;
       return [...newOnTop, ...prev];
     });
@@ -126,28 +137,17 @@ export function usePaginatedThreads(): UsePaginatedThreadsResult {
 
   // Load more function with debouncing
   const loadMore = useCallback(() => {
-    console.log('loadMore called with state:', {
-      isLoading,
-      isLoadingMore,
-      hasMore,
-      loadingRefCurrent: loadingRef.current,
-      currentPage,
-      threadsLength: allThreads.length
-    });
-    
-    if (!isLoading && !isLoadingMore && hasMore && !loadingRef.current) {
-      console.log('Incrementing page from', currentPage, 'to', currentPage + 1);
+    if (!isLoading && !isLoadingMore && hasMore && nextCursor && !loadingRef.current) {
       loadingRef.current = true;
       setIsLoadingMore(true);
-      setCurrentPage(prev => prev + 1);
-    } else {
-      console.log('loadMore blocked by conditions');
+      setCursor(nextCursor);
     }
-  }, [isLoading, isLoadingMore, hasMore, currentPage, allThreads.length]);
+  }, [isLoading, isLoadingMore, hasMore, nextCursor]);
 
   // Refresh function to reload from the beginning
   const refresh = useCallback(() => {
-    setCurrentPage(1);
+    setCursor(null);
+    setNextCursor(null);
     setAllThreads([]);
     setHasMore(true);
     setIsLoadingMore(false);
@@ -190,7 +190,7 @@ export function usePaginatedThreads(): UsePaginatedThreadsResult {
 
   return {
     threads: allThreads,
-    isLoading: isLoading && currentPage === 1, // Only show loading for initial load
+    isLoading: isLoading && cursor === null, // Only show loading for initial load
     isLoadingMore,
     error,
     hasMore,